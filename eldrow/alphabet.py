@@ -0,0 +1,61 @@
+"""The symbols a word list is spelled with, each given a dense code.
+
+Symbol k of an alphabet has code k, so a list of any script with no more
+than 256 distinct symbols encodes to one byte per character, however
+far its characters are from ASCII - which is what the byte-wide kernels
+in patterns and scoring, and the compiled word lists, work on.
+
+Some games treat different characters as the same letter: Termo, for
+one, gives the same feedback for 'suíte' as for 'suite'. Such a game is
+played on its words folded to the letters it actually distinguishes.
+"""
+import typing as ty
+import unicodedata
+from functools import cache
+
+MAX_SYMBOLS = 256  # codes must fit in a byte
+
+
+@cache
+def _codes(symbols: str) -> ty.Dict[str, int]:
+    return {c: k for k, c in enumerate(symbols)}
+
+
+@cache
+def _to_codes(symbols: str) -> ty.Dict[int, str]:
+    return {ord(c): chr(k) for k, c in enumerate(symbols)}
+
+
+@cache
+def _from_codes(symbols: str) -> ty.Dict[int, str]:
+    return dict(enumerate(symbols))
+
+
+class Alphabet(ty.NamedTuple):
+    symbols: str  # in code order
+
+    @property
+    def codes(self) -> ty.Dict[str, int]:
+        return _codes(self.symbols)
+
+    def spells(self, word: str) -> bool:
+        codes = self.codes
+        return all(c in codes for c in word)
+
+    def encode(self, text: str) -> bytes:
+        """The codes for text made up only of this alphabet's symbols."""
+        return text.translate(_to_codes(self.symbols)).encode("latin-1")
+
+    def decode(self, data: bytes) -> str:
+        return data.decode("latin-1").translate(_from_codes(self.symbols))
+
+
+def alphabet_of(words: ty.Iterable[str]) -> Alphabet:
+    """Every symbol the words use, in sorted order."""
+    return Alphabet("".join(sorted(set("".join(words)))))
+
+
+def fold_accents(text: str) -> str:
+    """The text without diacritics - 'á', 'â', 'ã' and 'à' are all 'a', 'ç' is 'c'."""
+    decomposed = unicodedata.normalize("NFD", text)
+    return unicodedata.normalize("NFC", "".join(c for c in decomposed if not unicodedata.combining(c)))
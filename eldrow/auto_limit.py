@@ -1,13 +1,102 @@
+"""How many candidates can be scored within a time budget, on this machine.
+
+Scoring a candidate costs a little for the candidate itself and a
+little more for every option it is scored against. Both are measured
+once, in this process; then every real run corrects the estimate by
+how far off it was, so that it follows the pool, the caches and the
+machine rather than a constant. All of it is kept in a JSON file in the
+working directory, next to the elimination store, so it survives
+sessions.
+"""
+import json
 import os
+import time
+import typing as ty
+from collections import Counter
+
+from . import parallel, words
+from .memoize import digest
+from .patterns import answers, encode_words
+
+DEFAULT_BUDGET = float(os.getenv("ELDROW_BUDGET", 2.0))  # seconds
+_CALIBRATION_FILE = os.getenv("ELDROW_CALIBRATION", "eldrow_calibration.json")
+# how far a single run moves the estimate.
+_WEIGHT = 0.3
+
+
+class Calibration(ty.NamedTuple):
+    per_candidate: float  # seconds
+    per_option: float  # seconds, for each option a candidate is scored against
+    correction: float  # how much longer than measured real runs have taken
+    workers: int
+
+    def seconds(self, n_candidates: int, n_options: int) -> float:
+        per = self.per_candidate + self.per_option * n_options
+        return n_candidates * per * self.correction / self.workers
+
+
+_CALIBRATION: ty.Optional[Calibration] = None
+
+
+def _load() -> ty.Optional[Calibration]:
+    try:
+        with open(_CALIBRATION_FILE) as f:
+            calibration = Calibration(**json.load(f))
+    except (OSError, ValueError, TypeError):
+        return None
+    return calibration if calibration.workers == parallel.workers() else None
+
+
+def _save(calibration: Calibration) -> None:
+    with open(_CALIBRATION_FILE, "w") as f:
+        json.dump(calibration._asdict(), f)
+
+
+def _time_per_candidate(n_options: int, seconds: float) -> float:
+    options = encode_words(words.sols[:n_options])
+    started = time.perf_counter()
+    scored = 0
+    while time.perf_counter() - started < seconds:
+        word = words.five_letter_word_list[scored % len(words.five_letter_word_list)]
+        digest(word)  # what looking the score up costs
+        Counter(answers(word, options))
+        scored += 1
+    return (time.perf_counter() - started) / scored
+
+
+def calibrate(seconds: float = 0.25) -> Calibration:
+    """Measures scoring against a few options and against many, in this process."""
+    few, many = 16, 1024
+    t_few, t_many = _time_per_candidate(few, seconds / 2), _time_per_candidate(many, seconds / 2)
+    per_option = max(0.0, (t_many - t_few) / (many - few))
+    return Calibration(max(0.0, t_few - per_option * few), per_option, 1.0, parallel.workers())
+
 
-_IS_SLOW = os.getenv("ELDROW_SLOW")
+def calibration() -> Calibration:
+    global _CALIBRATION
+    if _CALIBRATION is None:
+        _CALIBRATION = _load()
+    if _CALIBRATION is None:
+        _CALIBRATION = calibrate()
+        _save(_CALIBRATION)
+    return _CALIBRATION
 
 
-TAKES_ONE_SECOND = 14000
-TAKES_TWENTY_SECONDS = TAKES_ONE_SECOND * 20
+def observe(n_candidates: int, n_options: int, seconds: float) -> None:
+    """Corrects the estimate with a real run."""
+    global _CALIBRATION
+    if seconds < 0.1 or not n_candidates:
+        return  # too short to say much beyond the overheads
+    current = calibration()
+    off_by = seconds / current.seconds(n_candidates, n_options)
+    correction = current.correction * ((1 - _WEIGHT) + _WEIGHT * off_by)
+    _CALIBRATION = current._replace(correction=correction)
+    _save(_CALIBRATION)
 
 
-def auto_limit(n_options: int) -> int:
-    if not _IS_SLOW:
-        return 14000
-    return int(TAKES_TWENTY_SECONDS / n_options)
+def auto_limit(n_options: int, budget: ty.Optional[float] = None) -> int:
+    """How many candidates should be scored against this many options
+    to finish within the budget (in seconds).
+    """
+    budget = DEFAULT_BUDGET if budget is None else budget
+    return max(1, int(budget / calibration().seconds(1, n_options)))
@@ -0,0 +1,131 @@
+"""An opening book: the best guesses after a fixed opener, worked out
+ahead of time.
+
+After the opener, the game is in one of the few hundred states its
+patterns against the solutions can leave it in - the same few hundred
+every time. The book holds the best `k` words by elimination score, over
+every word, for each of those states (and optionally for each state the
+best of those words then leads to), keyed by the options left rather
+than by the guesses, so that any route to the same options finds them.
+
+Only words and scores are kept; everything else about a word depends on
+the game it is looked up for, and is worked out then.
+"""
+import gzip
+import json
+import os
+import typing as ty
+
+from . import words
+from .game import HashableGame, WordElim, _novelty_scorer, _simple_words, best_elim, get_options
+from .memoize import fingerprint
+from .patterns import answers, pattern_to_guess, solved
+
+BOOK_FILE = os.getenv("ELDROW_BOOK", "eldrow_book.json.gz")
+_VERSION = 1
+
+
+class Book(ty.NamedTuple):
+    opener: str
+    candidates: str  # fingerprint of the words every entry was chosen from
+    k: int
+    # the best k (word, elimination score), best last, by fingerprint of the options.
+    entries: ty.Dict[str, ty.List[ty.Tuple[str, float]]]
+
+
+def _key(options: ty.Iterable[str]) -> str:
+    return fingerprint(sorted(options))
+
+
+def _next_states(game: HashableGame, guess: str) -> ty.List[HashableGame]:
+    """Every state a guess can leave the game in, short of solving it."""
+    opts = get_options(game)
+    codes = set(answers(guess, opts)) - {solved(len(guess))}
+    return [
+        game._replace(guesses=(*game.guesses, pattern_to_guess(guess, code))) for code in sorted(codes)
+    ]
+
+
+def build(
+    start: HashableGame,
+    opener: str,
+    depth: int = 1,
+    k: int = 30,
+    progress: bool = False,
+    workers: ty.Optional[int] = None,
+) -> Book:
+    """Every state the opener can lead to, and, for each extra ply of
+    depth, every state the best word for each of those can lead to.
+    """
+    candidates = words.five_letter_word_list
+    entries: ty.Dict[str, ty.List[ty.Tuple[str, float]]] = dict()
+    frontier = [(start, opener)]
+    for ply in range(depth):
+        states = [state for game, guess in frontier for state in _next_states(game, guess)]
+        frontier = list()
+        for i, state in enumerate(states, 1):
+            key = _key(get_options(state))
+            if key in entries or len(get_options(state)) < 2:
+                continue  # already seen, or nothing left to choose between
+            if progress:
+                print(f"ply {ply + 1}, {i}/{len(states)}: {' '.join(state.guesses)}")
+            best = best_elim(state, candidates, workers, limit=k, progress=progress)
+            entries[key] = [(welim.scored_word, welim.elim_score) for welim in best]
+            frontier.append((state, best[-1].scored_word))
+    return Book(opener, fingerprint(candidates), k, entries)
+
+
+def save(book: Book, path: str = BOOK_FILE) -> None:
+    with gzip.open(path, "wt") as f:
+        json.dump(dict(book._asdict(), version=_VERSION), f, separators=(",", ":"))
+
+
+def load(path: str = BOOK_FILE) -> ty.Optional[Book]:
+    try:
+        with gzip.open(path, "rt") as f:
+            d = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if d.pop("version", None) != _VERSION:
+        return None
+    d["entries"] = {key: [(word, score) for word, score in best] for key, best in d["entries"].items()}
+    return Book(**d)
+
+
+_LOADED: ty.Dict[ty.Tuple[str, float], ty.Optional[Book]] = dict()
+
+
+def _book(path: str) -> ty.Optional[Book]:
+    """The book at path, loaded once for as long as the file is unchanged."""
+    try:
+        key = (path, os.path.getmtime(path))
+    except OSError:
+        return None
+    if key not in _LOADED:
+        _LOADED.clear()
+        _LOADED[key] = load(path)
+    return _LOADED[key]
+
+
+def lookup(
+    game: HashableGame, limit: ty.Optional[int] = None, path: str = BOOK_FILE
+) -> ty.Optional[ty.List[WordElim]]:
+    """What best_elim would find over every word, best last, if the book
+    has this game's options - otherwise None.
+    """
+    book = _book(path)
+    if book is None or book.candidates != fingerprint(words.five_letter_word_list):
+        return None
+    opts = get_options(game)
+    best = book.entries.get(_key(opts))
+    if best is None:
+        return None
+    opts_set = set(opts)
+    novelty_scorer = _novelty_scorer(game)
+    simple_guesses = _simple_words(*game.guesses)
+    welims = [
+        WordElim(score, novelty_scorer(*simple_guesses, word), word in opts_set, word)
+        for word, score in best
+    ]
+    welims.sort(key=lambda welim: (welim.elim_score, welim.is_possible_solution, welim.novelty_score))
+    return welims[-limit:] if limit else welims
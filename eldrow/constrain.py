@@ -1,7 +1,6 @@
 import string
 import typing as ty
-from collections import defaultdict
-from copy import deepcopy
+from functools import cache
 
 from .parse import guess_to_word
 from .parse import paren_yellow_parse as parse
@@ -14,10 +13,104 @@ __very_unusual_letters = "vzjxq"
 
 PositionEliminations = ty.Dict[int, ty.Set[str]]
 CharacterCount = ty.Dict[str, int]
-Constraint = ty.Tuple[PositionEliminations, CharacterCount]
+ConstraintSets = ty.Tuple[PositionEliminations, CharacterCount]
 
 
-def regexes2(constraint: Constraint) -> ty.Tuple[str, ...]:
+class Constraint(ty.NamedTuple):
+    """Everything known about a word, packed so that it is immutable,
+    hashable and cheap to merge.
+
+    Bit k of each position's mask stands for the k-th character of the
+    (sorted) alphabet, and is set when that character has been
+    eliminated from the position. Counts are per character of the
+    alphabet: the fewest and the most copies the word can contain.
+    """
+
+    alphabet: str
+    eliminated: ty.Tuple[int, ...]
+    min_counts: ty.Tuple[int, ...]
+    max_counts: ty.Tuple[int, ...]
+
+    @property
+    def full(self) -> int:
+        return (1 << len(self.alphabet)) - 1
+
+    def allowed(self, pos: int) -> int:
+        return self.full & ~self.eliminated[pos]
+
+    def chars(self, mask: int) -> ty.Set[str]:
+        return {c for k, c in enumerate(self.alphabet) if mask >> k & 1}
+
+    def counts(self) -> CharacterCount:
+        return {c: count for c, count in zip(self.alphabet, self.min_counts) if count}
+
+    def limits(self) -> CharacterCount:
+        """The most copies of each character the word can have, where that is known."""
+        n = len(self.eliminated)
+        return {c: count for c, count in zip(self.alphabet, self.max_counts) if count < n}
+
+    def merge(self, other: "Constraint") -> "Constraint":
+        """Constraints must be for strings of equal length and the same alphabet"""
+        return Constraint(
+            self.alphabet,
+            tuple(a | b for a, b in zip(self.eliminated, other.eliminated)),
+            tuple(map(max, self.min_counts, other.min_counts)),
+            tuple(map(min, self.max_counts, other.max_counts)),
+        )
+
+    def narrow(self) -> "Constraint":
+        # at this point, it's possible to use position-by-position process
+        # of elimination.  in other words, if a character is known to be
+        # required N times but is eliminated in all but N locations, then
+        # all other characters are eliminated from those N locations.
+        #
+        # Not only must this be run for every character, it must also
+        # be re-run with all non-finalized characters every time it results in a change.
+        eliminated = list(self.eliminated)
+        counted = [(k, count) for k, count in enumerate(self.min_counts) if count]
+        changed = True
+        while changed:
+            changed = False
+            for k, count in counted:
+                only = self.full & ~(1 << k)
+                remaining_positions_allowed = [i for i, e in enumerate(eliminated) if not e >> k & 1]
+                if len(remaining_positions_allowed) == count:
+                    for i in remaining_positions_allowed:
+                        if eliminated[i] != only:
+                            eliminated[i] = only
+                            changed = True
+        return self._replace(eliminated=tuple(eliminated))
+
+    def resolve(self) -> "Constraint":
+        """Applies everything that can be inferred from a merged
+        constraint, leaving it in the form `given2` describes.
+        """
+        constraint = self
+        #  total known characters    == number of characters per string
+        if sum(self.min_counts) == len(self.eliminated):
+            # then any char not appearing in char_counts must also be eliminated
+            uncounted = sum(1 << k for k, count in enumerate(self.min_counts) if not count)
+            constraint = self._replace(eliminated=tuple(e | uncounted for e in self.eliminated))
+        return constraint.narrow()
+
+    def eliminations(self) -> ConstraintSets:
+        return {i: self.chars(e) for i, e in enumerate(self.eliminated)}, self.counts()
+
+    def allowances(self) -> ConstraintSets:
+        return {i: self.chars(self.allowed(i)) for i in range(len(self.eliminated))}, self.counts()
+
+
+@cache
+def unconstrained(n: int, alpha: frozenset[str] = ALPHA) -> Constraint:
+    return Constraint("".join(sorted(alpha)), (0,) * n, (0,) * len(alpha), (n,) * len(alpha))
+
+
+@cache
+def _bits(alphabet: str) -> ty.Dict[str, int]:
+    return {c: 1 << k for k, c in enumerate(alphabet)}
+
+
+def regexes2(constraint: ConstraintSets) -> ty.Tuple[str, ...]:
     positions, counts = constraint
 
     def pos(i: int) -> str:
@@ -34,23 +127,24 @@ def regexes2(constraint: Constraint) -> ty.Tuple[str, ...]:
     return ("".join((pos(i) for i in positions)), *[count(c, i) for c, i in counts.items()])
 
 
-def constraint(guess: str, alpha: ty.Collection[str] = ALPHA) -> Constraint:
-    n = len(guess_to_word(guess))
-    position_eliminations: PositionEliminations = {i: set() for i in range(n)}
-    char_counts: CharacterCount = defaultdict(int)
+def packed_constraint(guess: str, alpha: frozenset[str] = ALPHA) -> Constraint:
+    base = unconstrained(len(guess_to_word(guess)), alpha)
+    n = len(base.eliminated)
+    bits = _bits(base.alphabet)
+    position_eliminations = list(base.eliminated)
+    char_counts = dict.fromkeys(base.alphabet, 0)
 
-    def eliminate(c, from_=set(range(n))):
+    def eliminate(c, from_=range(n)):
         for i in from_:
             # never eliminate the last character for a position
-            if len(position_eliminations[i]) < len(alpha) - 1:
-                position_eliminations[i].add(c)
-
-    alpha_set = set(alpha)
+            if position_eliminations[i].bit_count() < len(bits) - 1:
+                position_eliminations[i] |= bits[c]
 
     def require(rc, i):
-        position_eliminations[i] = alpha_set - {rc}
+        position_eliminations[i] = base.full & ~bits[rc]
 
     already_yellow = set()
+    grays = set()
     for i, (color, c) in enumerate(parse(guess)):
         if color == "yellow":
             eliminate(c, {i})
@@ -75,56 +169,48 @@ def constraint(guess: str, alpha: ty.Collection[str] = ALPHA) -> Constraint:
                 eliminate(c, {i})
             else:
                 eliminate(c)
-    return position_eliminations, dict(char_counts)
-
-
-def _merge_constraints(ca: Constraint, cb: Constraint) -> Constraint:
-    """Constraints must be for strings of equal length"""
-    elims_a, cc_a = ca
-    elims_b, cc_b = cb
-    return {i: elims_a[i] | elims_b[i] for i in range(len(elims_a))}, {
-        c: max(cc_a.get(c, 0), cc_b.get(c, 0)) for c in list((*cc_a.keys(), *cc_b.keys()))
-    }
-
-
-def merge_constraints(*constraints: Constraint) -> Constraint:
-    merged = None
-    for constraint in constraints:
-        merged = constraint if merged is None else _merge_constraints(merged, constraint)  # type: ignore
-    assert merged, "Cannot merge zero constraints"
-    return merged
-
-
-def _narrow_constraint(alpha: frozenset[str], constraint: Constraint) -> Constraint:
-    # at this point, it's possible to use position-by-position process
-    # of elimination.  in other words, if a character is known to be
-    # required N times but is eliminated in all but N locations, then
-    # all other characters are eliminated from those N locations.
-    #
-    # Not only must this be run for every character, it must also
-    # be re-run with all non-finalized characters every time it results in a change.
-    def run(constraint: Constraint) -> Constraint:
-        pos_elims, char_counts = constraint
-        for char, count in char_counts.items():
-            remaining_positions_allowed = set(pos_elims)
-            for pos, eliminations in pos_elims.items():
-                if char in eliminations:
-                    remaining_positions_allowed -= {pos}
-            if len(remaining_positions_allowed) == count:
-                pos_elims = deepcopy(pos_elims)
-                for pos in remaining_positions_allowed:
-                    pos_elims[pos] = set(alpha - {char})
-                return pos_elims, char_counts
-        return pos_elims, char_counts
-
-    while True:
-        new_constraint = run(constraint)
-        if new_constraint == constraint:
-            return constraint
-        constraint = new_constraint
-
-
-def given2(*guesses: str, alpha: frozenset[str] = ALPHA, empty_n: int = 5) -> Constraint:
+            grays.add(c)
+
+    # wherever it falls, a gray copy of a character means the word has exactly
+    # as many of it as this guess has yellow and green copies - never more.
+    max_counts = tuple(char_counts[c] if c in grays else n for c in base.alphabet)
+    return Constraint(
+        base.alphabet, tuple(position_eliminations), tuple(char_counts.values()), max_counts
+    )
+
+
+def constraint(guess: str, alpha: frozenset[str] = ALPHA) -> ConstraintSets:
+    return packed_constraint(guess, alpha).eliminations()
+
+
+def _pack(constraint: ConstraintSets, alpha: frozenset[str] = ALPHA) -> Constraint:
+    elims, char_counts = constraint
+    base = unconstrained(len(elims), alpha)
+    bits = _bits(base.alphabet)
+    return base._replace(
+        eliminated=tuple(sum(bits[c] for c in elims[i]) for i in range(len(elims))),
+        min_counts=tuple(char_counts.get(c, 0) for c in base.alphabet),
+    )
+
+
+def merge_constraints(*constraints: ConstraintSets) -> ConstraintSets:
+    packed = [_pack(constraint) for constraint in constraints]
+    assert packed, "Cannot merge zero constraints"
+    merged = packed[0]
+    for other in packed[1:]:
+        merged = merged.merge(other)
+    return merged.eliminations()
+
+
+def given(*guesses: str, alpha: frozenset[str] = ALPHA, empty_n: int = 5) -> Constraint:
+    """`given2`, as a packed Constraint."""
+    merged = unconstrained(len(guess_to_word(guesses[0])) if guesses else empty_n, alpha)
+    for guess in guesses:
+        merged = merged.merge(packed_constraint(guess, alpha))
+    return merged.resolve() if guesses else merged
+
+
+def given2(*guesses: str, alpha: frozenset[str] = ALPHA, empty_n: int = 5) -> ConstraintSets:
     """Format:
 
     lowercase letters for incorrect guesses.
@@ -138,13 +224,4 @@ def given2(*guesses: str, alpha: frozenset[str] = ALPHA, empty_n: int = 5) -> Co
 
     If the correct answer is BROWN, B(OR)oN would be the guess representation for 'boron'.
     """
-    if not guesses:
-        return {i: set(alpha - set()) for i in range(empty_n)}, dict()
-    elims, char_counts = merge_constraints(*[constraint(guess) for guess in guesses])
-    #  total known characters    == number of characters per string
-    if sum(char_counts.values()) == len(elims):
-        # then any char not appearing in char_counts must also be eliminated
-        for eliminated in elims.values():
-            eliminated |= alpha - set(char_counts)
-    elims, char_counts = _narrow_constraint(alpha, (elims, char_counts))
-    return {i: set(alpha - e) for i, e in elims.items()}, char_counts
+    return given(*guesses, alpha=alpha, empty_n=empty_n).allowances()
@@ -1,102 +1,28 @@
-import re
+import math
+import random
 import typing as ty
-from collections import defaultdict
-from functools import cache
-from typing import List
+from collections import Counter
+from functools import lru_cache
 
-from .constrain import given2, regexes2
-from .memoize import elim_cache
+from . import parallel
+from .memoize import cache_keys, elim_cache, fingerprint
 from .parse import guess_to_word
-from .scoring import Scorer
-from .words import five_letter_word_list
+from .patterns import answers, encode_words, pattern, pattern_matrix, pattern_to_guess
+from .scoring import BatchScorer, Scorer, batched
 
-
-@cache
-def compile(regex_str: str):
-    return re.compile(regex_str)
-
-
-@cache
-def options(regex_strs: ty.Tuple[str, ...], wl: ty.Tuple[str, ...] = five_letter_word_list) -> List[str]:
-    opts = list()
-    regexes = tuple(compile(regex_str) for regex_str in regex_strs)
-    for w in wl:
-        allowed = True
-        for regex in regexes:
-            if not regex.search(w):
-                allowed = False
-                break
-        if allowed:
-            opts.append(w)
-    return opts
+# part of every elimination cache key, so that changing how scores are
+# computed never serves up scores from an older version.
+ELIMINATION_SCORER_VERSION = 2
 
 
 def answer(solution: str, guess: str) -> str:
     if len(solution) != len(guess):
         return guess
     guess = guess_to_word(guess)
-    char_counts: dict[str, int] = defaultdict(int)
-    for c in solution:
-        char_counts[c] += 1
-
-    for guess_c, c in zip(guess, solution):
-        if guess_c == c:
-            char_counts[c] -= 1
-
-    results = list()
-    is_yellow = False
-
-    def end_yellow():
-        nonlocal is_yellow
-        if is_yellow:
-            results.append(")")
-            is_yellow = False
-
-    def start_yellow():
-        nonlocal is_yellow
-        if not is_yellow:
-            results.append("(")
-            is_yellow = True
-
-    for guess_c, c in zip(guess, solution):
-        if guess_c == c:
-            # correct! (green)
-            end_yellow()
-            results.append(c.upper())
-        elif char_counts.get(guess_c):
-            start_yellow()
-            results.append(guess_c.upper())
-            char_counts[guess_c] -= 1
-        else:
-            end_yellow()
-            results.append(guess_c.lower())
-
-    end_yellow()
-    return "".join(results)
-
-
-def options_after_guess(
-    alpha: frozenset[str],
-    word_list: ty.Tuple[str, ...],
-    guesses: ty.Sequence[str],
-) -> ty.Callable[[str, str], ty.List[str]]:
-    def options_after_guess_(solution: str, guess: str) -> List[str]:
-        constraint = given2(*(*guesses, answer(solution, guess)), alpha=alpha, empty_n=len(guess))
-        return options(regexes2(constraint), wl=word_list)
-
-    return options_after_guess_
-
-
-class DataForOptionsAfterGuess(ty.NamedTuple):
-    alpha: frozenset[str]
-    word_list: ty.Tuple[str, ...]
-    guesses: ty.Sequence[str]
-
-
-def elimination_scorer(
-    remaining_possibilities: ty.Collection[str],
-    data_for_options_after_guess: DataForOptionsAfterGuess,
-) -> Scorer:
+    return pattern_to_guess(guess, pattern(solution, guess))
+
+
+def elimination_scorer(remaining_possibilities: ty.Collection[str]) -> BatchScorer:
     """The idea is to optimize discovering information _about_ the word
     rather than solving for the word itself. Therefore, knowledge of
     whether a character is present (yellow) is valuable in a way that
@@ -109,28 +35,184 @@ def elimination_scorer(
     Maybe this should be called the elimination scorer, and it should
     focus on picking letters that will reduce the total score in the
     position_scores dict.
+
+    A score depends only on the remaining possibilities and the word
+    being scored - not on the guesses, alphabet or word list that led
+    there - so scores are cached under exactly that, and any two game
+    states that leave the same possibilities share them.
     """
-    alpha, word_list, guesses = data_for_options_after_guess
-    dfo = (
-        alpha,
-        word_list,
-        tuple(sorted(guesses)),
-        # the constraints on your word are not affected by the order of guesses,
-        # so we can sort them to make the cache key slightly more consistent
-    )
-    the_options_would_be = options_after_guess(*data_for_options_after_guess)
+    possibilities = tuple(remaining_possibilities)
+    n = len(possibilities)
+    possibilities_set = set(possibilities)
+    matrix = pattern_matrix()
+    columns = matrix.columns(possibilities)
+    solutions = encode_words(possibilities)
 
     def scorer(*words: str) -> float:
+        # every assumed solution leaves exactly the possibilities that would
+        # have produced the same pattern, so the options left for each one
+        # is just the size of its pattern bucket.
         new_word_to_score = words[-1]
-        total_eliminated = 0
-        for assumed_solution in remaining_possibilities:
-            if assumed_solution == new_word_to_score:
-                num_left = 0
-            else:
-                num_left = len(the_options_would_be(assumed_solution, new_word_to_score))
-            total_eliminated += len(remaining_possibilities) - num_left
-        return round(total_eliminated / len(remaining_possibilities), 3)
+        buckets = Counter(matrix.patterns(new_word_to_score, solutions, columns))
+        total_eliminated = n * n - sum(size * size for size in buckets.values())
+        if new_word_to_score in possibilities_set:
+            # guessing the solution itself leaves nothing at all,
+            # rather than the one word in its bucket.
+            total_eliminated += 1
+        return round(total_eliminated / n, 3)
+
+    cached = elim_cache(ELIMINATION_SCORER_VERSION, fingerprint(sorted(possibilities)))(scorer)
+
+    def score_batch(prefix_words: ty.Sequence[str], candidates: ty.Sequence[str]) -> ty.List[float]:
+        # the prefix doesn't change a word's score, and only one word of
+        # each class that must score the same is scored.
+        candidates = tuple(candidates)
+        scores = [0.0] * len(candidates)
+        for members in equivalence_classes(candidates, possibilities):
+            score = cached(candidates[members[0]])
+            for i in members:
+                scores[i] = score
+        return scores
+
+    return batched(cached, score_batch)
+
+
+def elimination_keys(options_fingerprint: str) -> ty.Callable[[str], str]:
+    """Makes the keys `elimination_scorer` keeps each word's score under in
+    `elim_store`, for the options with that fingerprint (of them sorted).
+    """
+    return cache_keys(ELIMINATION_SCORER_VERSION, options_fingerprint)
+
 
-    if len(guesses) < 4:
-        return elim_cache(tuple(remaining_possibilities), dfo)(scorer)
-    return scorer
+def bounded_elimination_scorer(
+    remaining_possibilities: ty.Collection[str],
+) -> ty.Callable[[str, ty.Optional[float]], ty.Optional[float]]:
+    """Like `elimination_scorer`, but given a threshold (e.g. the score a word
+    must beat to make a top-k list), gives up on a word - returning None -
+    when its score provably falls short, without working out its patterns.
+
+    Every score that is returned is exact.
+    """
+    possibilities = tuple(remaining_possibilities)
+    n = len(possibilities)
+    possibilities_set = set(possibilities)
+    exact = elimination_scorer(possibilities)
+    # how many possibilities have each character at each position, and anywhere.
+    at = Counter((i, c) for word in possibilities for i, c in enumerate(word))
+    anywhere = Counter(c for word in possibilities for c in set(word))
+
+    def least_sum_of_squares(word: str) -> float:
+        # the colors each position could turn bound how many pattern buckets
+        # there can be, and Σ size² is least when the possibilities are spread
+        # evenly over them. Where a character appears only once in the word,
+        # exactly how many possibilities turn its position each color is
+        # known, which only the other positions' colors can split further.
+        colors: ty.List[int] = list()
+        by_color: ty.List[float] = list()
+        for i, c in enumerate(word):
+            green, with_c = at[(i, c)], anywhere[c]
+            colors.append((green > 0) + (green < n) + (with_c > green))
+            if word.count(c) == 1:
+                by_color.append(green**2 + (with_c - green) ** 2 + (n - with_c) ** 2)
+            else:
+                by_color.append(n * n / colors[-1])
+        n_buckets = math.prod(colors)
+        return max(
+            n * n / min(n, n_buckets),
+            *(sizes * n_colors / n_buckets for sizes, n_colors in zip(by_color, colors)),
+        )
+
+    def score(word: str, threshold: ty.Optional[float] = None) -> ty.Optional[float]:
+        if threshold is not None and n:
+            bound = (n * n - least_sum_of_squares(word) + (word in possibilities_set)) / n
+            # a little slack, so float error can never prune a word that would tie
+            if round(bound + 1e-9, 3) < threshold:
+                return None
+        return exact(word)
+
+    return score
+
+
+def sampled_elimination_estimator(
+    remaining_possibilities: ty.Collection[str], sample_size: int = 128, seed: int = 0
+) -> Scorer:
+    """A much cheaper estimate of the elimination score, from the buckets
+    a random sample of the possibilities fall into - for deciding which
+    words are worth scoring exactly. Not cached, since it is only ever
+    asked about each word once.
+
+    A pair of sampled possibilities shares a bucket with the same chance
+    as any pair does, so Σ size² is estimated without bias from the
+    pairs in the sample that share one.
+    """
+    possibilities = tuple(remaining_possibilities)
+    n = len(possibilities)
+    possibilities_set = set(possibilities)
+    if n <= sample_size:
+        sample = possibilities
+    else:
+        sample = tuple(random.Random(seed).sample(sorted(possibilities), sample_size))
+    m = len(sample)
+    encoded = encode_words(sample)
+    pairs_scale = n * (n - 1) / (m * (m - 1)) if m > 1 else 0.0
+
+    def estimator(*words: str) -> float:
+        word = words[-1]
+        sharing = sum(size * (size - 1) for size in Counter(answers(word, encoded)).values())
+        sum_of_squares = n + sharing * pairs_scale
+        return round((n * n - sum_of_squares + (word in possibilities_set)) / n, 3)
+
+    return estimator
+
+
+def equivalence_classes(
+    candidates: ty.Sequence[str], remaining_possibilities: ty.Collection[str]
+) -> ty.List[ty.List[int]]:
+    """Groups the candidates (by index, in order) into classes that
+    split the possibilities into exactly the same buckets - and that
+    are all possibilities or all not - so that every word in a class
+    has the same elimination score.
+
+    The colors a letter turns depend only on the letter and where the
+    word has it, so each letter splits the possibilities by itself, and
+    a word's buckets are where all of its letters' splits meet. Two
+    words whose letters split the possibilities the same ways - whatever
+    the letters, positions or colors - have the same buckets.
+    """
+    possibilities = tuple(remaining_possibilities)
+    possibilities_set = set(possibilities)
+    green: ty.Dict[ty.Tuple[int, str], int] = Counter()
+    anywhere: ty.Dict[str, int] = Counter()
+    for k, word in enumerate(possibilities):
+        for i, c in enumerate(word):
+            green[(i, c)] |= 1 << k
+            anywhere[c] |= 1 << k
+    everything = (1 << len(possibilities)) - 1
+
+    def split(word: str, c: str) -> ty.Optional[tuple]:
+        positions = tuple(i for i, word_c in enumerate(word) if word_c == c)
+        if not anywhere[c]:
+            return None  # always gray
+        if len(positions) > 1:
+            # repeated letters split the possibilities in ways that aren't
+            # worth working out just to compare them.
+            return c, positions
+        greens = green[(positions[0], c)]
+        yellows = anywhere[c] & ~greens
+        parts = tuple(sorted(part for part in (greens, yellows, everything ^ anywhere[c]) if part))
+        return parts if len(parts) > 1 else None
+
+    def signature(word: str) -> ty.FrozenSet[tuple]:
+        return frozenset(filter(None, (split(word, c) for c in set(word))))
+
+    classes: ty.Dict[ty.Tuple[ty.FrozenSet[tuple], bool], ty.List[int]] = dict()
+    for index, word in enumerate(candidates):
+        classes.setdefault((signature(word), word in possibilities_set), list()).append(index)
+    return list(classes.values())
+
+
+@lru_cache(maxsize=8)
+def shared_bounded_elimination_scorer(
+    possibilities: parallel.SharedWords,
+) -> ty.Callable[[str, ty.Optional[float]], ty.Optional[float]]:
+    return bounded_elimination_scorer(parallel.words(possibilities))
@@ -1,17 +1,42 @@
+import heapq
 import itertools
+import math
+import multiprocessing
+import time
 import typing as ty
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
 
-from .constrain import given2, regexes2
-from .elimination import DataForOptionsAfterGuess, answer, elimination_scorer, options
+from . import auto_limit, parallel
+from .constrain import Constraint, ConstraintSets, packed_constraint, unconstrained
+from .elimination import answer, equivalence_classes, shared_bounded_elimination_scorer
+from .memoize import elim_store
 from .parse import guess_to_word
+from .progress import Progress, TopK, collect
 from .scoring import (
+    BatchScorer,
     best_next_score,
     construct_position_freqs,
     replace_solved_with_average_totals,
+    score_batch,
     score_for_novelty,
     score_words,
 )
+from .wordindex import word_index
+
+
+class OptionState(ty.NamedTuple):
+    """What is known after a given guess - the merged (unresolved)
+    constraint of all guesses so far, its resolved form, and the
+    surviving options as a bitset over the word list.
+    """
+
+    wl: ty.Tuple[str, ...]
+    alpha: frozenset[str]
+    guess: str
+    merged: Constraint
+    given: Constraint
+    options: int
 
 
 @dataclass
@@ -23,6 +48,10 @@ class Game:
     guesses: ty.List[str]
     possibilities: ty.List[str]
     ignored: ty.Set[str]
+    # one OptionState per guess, on top of the state with no guesses at all.
+    # kept in sync with `guesses` lazily, so popping a guess off just drops
+    # the states above it.
+    states: ty.List[OptionState] = field(default_factory=list, repr=False, compare=False)
 
 
 class HashableGame(ty.NamedTuple):
@@ -39,15 +68,85 @@ def new_game(alpha: ty.Collection[str], wl: ty.Collection[str]) -> Game:
 
 
 def hashable(game: Game) -> HashableGame:
-    return HashableGame(game.n, game.wl, game.alpha, tuple(game.guesses), tuple(game.ignored))
+    hgame = HashableGame(game.n, game.wl, game.alpha, tuple(game.guesses), tuple(game.ignored))
+    _remember_state(hgame, _state(game))
+    return hgame
 
 
 def _simple_words(*guesses) -> ty.List[str]:
     return [guess_to_word(guess) for guess in guesses]
 
 
-def _given(game: HashableGame | Game):
-    return given2(*game.guesses, alpha=game.alpha, empty_n=game.n)
+def _initial_state(n: int, wl: ty.Tuple[str, ...], alpha: frozenset[str]) -> OptionState:
+    nothing_known = unconstrained(n, alpha)
+    return OptionState(wl, alpha, "", nothing_known, nothing_known, word_index(wl).all)
+
+
+def _narrow(state: OptionState, guess: str, alpha: frozenset[str]) -> OptionState:
+    """Options only ever shrink as guesses are added, so only the
+    previous survivors need to be considered.
+    """
+    merged = state.merged.merge(packed_constraint(guess, alpha))
+    given = merged.resolve()
+    options = state.options & word_index(state.wl).matching(given)
+    return OptionState(state.wl, alpha, guess, merged, given, options)
+
+
+def _game_state(game: Game) -> OptionState:
+    states = game.states
+    if not states or states[0].wl is not game.wl or states[0].alpha != game.alpha:
+        states[:] = [_initial_state(game.n, game.wl, game.alpha)]
+
+    depth = 0
+    while (
+        depth < min(len(states) - 1, len(game.guesses))
+        and states[depth + 1].guess == game.guesses[depth]
+    ):
+        depth += 1
+    del states[depth + 1 :]
+    for guess in game.guesses[depth:]:
+        states.append(_narrow(states[-1], guess, game.alpha))
+    return states[-1]
+
+
+_HASHABLE_STATES: OrderedDict[HashableGame, OptionState] = OrderedDict()
+_MAX_HASHABLE_STATES = 256
+
+
+def _state_key(game: HashableGame) -> HashableGame:
+    # the ignored words are filtered out separately, after the options are found
+    return game._replace(ignored=tuple())
+
+
+def _remember_state(game: HashableGame, state: OptionState) -> None:
+    _HASHABLE_STATES[_state_key(game)] = state
+    _HASHABLE_STATES.move_to_end(_state_key(game))
+    while len(_HASHABLE_STATES) > _MAX_HASHABLE_STATES:
+        _HASHABLE_STATES.popitem(last=False)
+
+
+def _hashable_state(game: HashableGame) -> OptionState:
+    try:
+        state = _HASHABLE_STATES[_state_key(game)]
+    except KeyError:
+        if game.guesses:
+            state = _narrow(
+                _hashable_state(game._replace(guesses=game.guesses[:-1])), game.guesses[-1], game.alpha
+            )
+        else:
+            state = _initial_state(game.n, game.wl, game.alpha)
+    _remember_state(game, state)
+    return state
+
+
+def _state(game: HashableGame | Game) -> OptionState:
+    if isinstance(game, Game):
+        return _game_state(game)
+    return _hashable_state(game)
+
+
+def _given(game: HashableGame | Game) -> ConstraintSets:
+    return _state(game).given.allowances()
 
 
 def letters(game: Game) -> ty.List[str]:
@@ -56,7 +155,8 @@ def letters(game: Game) -> ty.List[str]:
 
 
 def get_options(game: HashableGame | Game) -> tuple[str, ...]:
-    return tuple([w for w in options(regexes2(_given(game)), wl=game.wl) if w not in game.ignored])
+    state = _state(game)
+    return tuple([w for w in word_index(game.wl).select(state.options) if w not in game.ignored])
 
 
 def unparse(game: Game, guess: str) -> str:
@@ -64,7 +164,7 @@ def unparse(game: Game, guess: str) -> str:
     return answer(game.solution, guess) or guess
 
 
-def best_options(game: Game) -> list[tuple[int, str]]:
+def best_options(game: Game | HashableGame) -> list[tuple[float, str]]:
     remaining_words = get_options(game)
     return best_next_score(
         remaining_words,
@@ -73,15 +173,15 @@ def best_options(game: Game) -> list[tuple[int, str]]:
     )
 
 
-def _novelty_scorer(game: Game | HashableGame) -> ty.Callable[..., float]:
+def _novelty_scorer(game: Game | HashableGame) -> BatchScorer:
     return score_for_novelty(
         replace_solved_with_average_totals(construct_position_freqs(get_options(game)))
     )
 
 
 def novelty(game: Game | HashableGame, *words: str) -> list[tuple[str, float]]:
-    novelty_scorer = _novelty_scorer(game)
-    return [(w, novelty_scorer(*_simple_words(*game.guesses), w)) for w in words]
+    scores = score_batch(_novelty_scorer(game), _simple_words(*game.guesses), words)
+    return list(zip(words, scores))
 
 
 def best_novelty(game: Game | HashableGame, *words: str) -> list[tuple[float, str]]:
@@ -108,34 +208,147 @@ class WordElim(ty.NamedTuple):
     scored_word: str
 
 
-def best_elim(game: HashableGame, wordlist: ty.Collection[str]) -> list[WordElim]:
+_ANYTIME_CHUNK = 128
+
+
+def _elim_scores(
+    opts: parallel.SharedWords,
+    candidates: parallel.SharedWords,
+    start: int,
+    stop: int,
+    limit: ty.Optional[int] = None,
+    deadline: ty.Optional[float] = None,
+    threshold: ty.Optional[float] = None,
+) -> ty.List[ty.Optional[float]]:
+    """None for each candidate that provably can't make the best `limit`,
+    having already been beaten by `limit` others in this chunk - or by
+    the threshold, the score that was last in the best `limit` of every
+    chunk done before this one started.
+
+    Stops early, leaving the rest of the chunk unscored, at the deadline.
+    """
+    scorer = shared_bounded_elimination_scorer(opts)
+    best: ty.List[float] = list()  # a heap of the best `limit` scores so far
+    scores: ty.List[ty.Optional[float]] = list()
+    try:
+        for word in parallel.words(candidates)[start:stop]:
+            if deadline is not None and time.time() > deadline:
+                break
+            to_beat = best[0] if limit and len(best) == limit else None
+            if threshold is not None:
+                to_beat = threshold if to_beat is None else max(to_beat, threshold)
+            score = scorer(word, to_beat)
+            scores.append(score)
+            if score is not None and limit:
+                if len(best) < limit:
+                    heapq.heappush(best, score)
+                elif score > best[0]:
+                    heapq.heapreplace(best, score)
+        return scores
+    finally:
+        # pool workers exit without running atexit handlers; in this process,
+        # the store's own batching (and best_elim's caller) commits.
+        if multiprocessing.parent_process() is not None:
+            elim_store.commit()
+
+
+def best_elim(
+    game: HashableGame,
+    wordlist: ty.Collection[str],
+    workers: ty.Optional[int] = None,
+    limit: ty.Optional[int] = None,
+    progress: bool = False,
+    budget: ty.Optional[float] = None,
+) -> list[WordElim]:
+    """Candidates are scored in chunks on the shared process pool; pass
+    workers=1 (or set ELDROW_SINGLETHREADED) to score them all here.
+
+    Only the best `limit` are kept (all of them if limit is None), best
+    last; candidates that provably can't make the cut are pruned without
+    being scored, and so are all but one of any candidates that must
+    score the same. Ctrl-C returns the best of the candidates scored so far.
+
+    With a budget (in seconds, from when scoring starts), candidates are
+    scored in the order given, for as long as it allows - so pass the
+    most promising first.
+    """
     opts = get_options(game)
+    opts_set = set(opts)
     novelty_scorer = _novelty_scorer(game)
     simple_guesses = _simple_words(*game.guesses)
 
-    by_is_option = lambda x: x[2]
-    by_novelty_score = lambda x: x[1]
-    by_elim_score = lambda x: x[0]
-
-    def sort_many(sorts, xs):
-        for sort in sorts:
-            xs = sorted(xs, key=sort)
-        return xs
-
-    return sort_many(
-        [by_novelty_score, by_is_option, by_elim_score],
-        [
-            WordElim(score, novelty_scorer(*simple_guesses, word), word in opts, word)
-            for score, word in best_next_score(
-                wordlist,
-                scorer=elimination_scorer(
-                    opts,
-                    DataForOptionsAfterGuess(
-                        game.alpha,
-                        opts,
-                        game.guesses,
-                    ),
-                ),
-            )
-        ],
-    )
+    candidates = tuple(wordlist)
+    # only one word from each class of words that must score the same is scored.
+    classes = equivalence_classes(candidates, opts)
+    representatives = tuple(candidates[members[0]] for members in classes)
+    n_chunks = (workers or parallel.workers()) * 4
+    if budget is not None:
+        # small enough that the pool takes them in about the order given
+        n_chunks = max(n_chunks, math.ceil(len(representatives) / _ANYTIME_CHUNK))
+    chunks = parallel.ranges(len(representatives), n_chunks)
+    # throughput is measured from the first results back, so that
+    # starting the pool doesn't count against it.
+    first_back: ty.Optional[float] = None
+    scored = 0
+
+    def word_elims(kept: ty.List[ty.Tuple[int, float]]) -> ty.List[ty.Tuple[int, WordElim]]:
+        words = [candidates[i] for i, _score in kept]
+        novelties = score_batch(novelty_scorer, simple_guesses, words)
+        return [
+            (i, WordElim(score, novelty, word in opts_set, word))
+            for (i, score), novelty, word in zip(kept, novelties, words)
+        ]
+
+    # ranked by elimination, then by whether it could be the solution, then
+    # by novelty; ties go to whichever comes later in the word list.
+    def rank(i_welim: ty.Tuple[int, WordElim]) -> tuple:
+        i, welim = i_welim
+        return welim.elim_score, welim.is_possible_solution, welim.novelty_score, i
+
+    top: TopK[ty.Tuple[int, WordElim]] = TopK(limit, rank)
+
+    def tasks(
+        shared_opts: parallel.SharedWords, shared_representatives: parallel.SharedWords
+    ) -> ty.Iterator[tuple]:
+        deadline = time.time() + budget if budget is not None else None
+        for r in chunks:
+            # built only as the last is taken - which, in this process,
+            # is once every chunk before it has been collected.
+            last = top.last()
+            threshold = last[1].elim_score if last is not None else None
+            yield shared_opts, shared_representatives, r.start, r.stop, limit, deadline, threshold
+
+    def results(tasks: ty.Iterable[tuple]) -> ty.Iterator[ty.Tuple[int, ty.List, int]]:
+        nonlocal first_back, scored
+        for (_opts, _candidates, start, stop, *_rest), scores in parallel.imap(
+            _elim_scores, tasks, workers=workers
+        ):
+            kept: ty.List[ty.Tuple[int, float]] = list()
+            done = pruned = 0
+            for members, score in zip(classes[start:stop], scores):
+                done += len(members)
+                if score is None:
+                    pruned += len(members)
+                else:
+                    kept.extend((i, score) for i in members)
+            if first_back is None:
+                first_back = time.monotonic()
+            else:
+                scored += done
+            yield done, word_elims(kept), pruned
+
+    with parallel.shared_words(opts, representatives) as (shared_opts, shared_representatives):
+        collect(
+            results(tasks(shared_opts, shared_representatives)),
+            top,
+            Progress(len(candidates), describe=lambda i_welim: _describe(i_welim[1]))
+            if progress
+            else None,
+        )
+    if workers is None and first_back is not None:
+        auto_limit.observe(scored, len(opts), time.monotonic() - first_back)
+    return [welim for _i, welim in top.sorted()]
+
+
+def _describe(welim: WordElim) -> str:
+    return f"{welim.scored_word} {welim.elim_score:.3f}"
@@ -8,9 +8,9 @@ from typing import Callable, List
 
 from IPython.core.magic import Magics, line_magic, magics_class
 
-from . import colors
-from .auto_limit import auto_limit
-from .constrain import ALPHA, guess_to_word
+from . import book, colors, words
+from .auto_limit import DEFAULT_BUDGET, auto_limit
+from .constrain import guess_to_word
 from .explore import explore
 from .formatting import _format_welim, _p
 from .game import (
@@ -27,7 +27,7 @@ from .game import (
 from .memoize import elim_store
 from .multi import all_or_opts_wordlist_creators, elim_across_games
 from .scoring import construct_position_freqs, score_words
-from .words import five_letter_word_list, sols
+from .solve import Node, Objective, save, solve
 
 
 def kill_words(*words: str) -> None:
@@ -81,14 +81,17 @@ class IpythonCli(Magics):
         # You must call the parent constructor
         super().__init__(shell)
         self.limit = 15
-        self.wl = sols
+        self.budget = DEFAULT_BUDGET
+        self.tree: Node | None = None
+        self.horizon = None
+        self.wl = words.sols
         self.n = len(self.wl[0])
         self.reset(None)
 
     def _new_game(self, index: int):
         with open("killed.txt") as f:
             to_ignore = set(f.read().splitlines())
-        game = new_game(ALPHA, self.wl)
+        game = new_game(words.alphabet().symbols, self.wl)
         game.ignored = to_ignore
         self.games[index] = game
         return game
@@ -114,12 +117,12 @@ class IpythonCli(Magics):
     @line_magic
     def word_list(self, _):
         """Switch the word lists"""
-        if self.wl is sols:
+        if self.wl is words.sols:
             print("Switched to full word list")
-            self.wl = five_letter_word_list
+            self.wl = words.five_letter_word_list
         else:
             print("Switched to likely candidates")
-            self.wl = sols
+            self.wl = words.sols
         for game in self.games.values():
             game.wl = self.wl
             self._summarize(game)
@@ -145,7 +148,7 @@ class IpythonCli(Magics):
         num = int(line) if line else 1
         for i in range(1, num + 1):
             self._new_game(i)
-            self.games[i].solution = random.choice(sols)
+            self.games[i].solution = random.choice(words.sols)
         assert len(self.games) == len(
             {g.solution for g in self.games.values()}
         ), "Try again - we picked the same word multiple times"
@@ -200,10 +203,11 @@ class IpythonCli(Magics):
     def _guess(self, game, line):
         for guess in line.split(" "):
             if guess:
+                guess = words.fold(guess)
                 if game.solution:
                     guess = unparse(game, guess)
                 guess_word = guess_to_word(guess)
-                if guess_word not in five_letter_word_list:
+                if not words.is_word(guess_word):
                     return None
                 if guess not in game.guesses:
                     game.guesses.append(guess)
@@ -297,29 +301,83 @@ class IpythonCli(Magics):
         words = words.split()
         return [(score, word) for score, word in zip(novelty(game, *words), words)]
 
-    def _best_elim(self, game, wordlist):
+    def _best_elim(self, game, wordlist, budget=None):
         self._summarize(game)
 
         try:
-            return [_format_welim(t) for t in best_elim(hashable(game), wordlist)[-self.limit :]]
+            return [
+                _format_welim(t)
+                for t in best_elim(
+                    hashable(game), wordlist, limit=self.limit, progress=True, budget=budget
+                )
+            ]
         finally:
             elim_store.commit()
 
+    @line_magic
+    def budget(self, line):
+        """Seconds %best_elim may spend, when not given a number of words."""
+        if line:
+            self.budget = float(line)
+        return self.budget
+
     @line_magic
     def best_elim(self, line):
         """Limit in this case only calculates against the first N words as
-        scored by the best_novelty scorer.  This algorithm is N**2 and
-        very expensive, so it generally shouldn't be run against lots
+        ranked by a sampled estimate of their elimination score (or by
+        the best_novelty scorer, with `novel`).  This algorithm is N**2
+        and very expensive, so it generally shouldn't be run against lots
         of options.
+
+        States in the opening book (see scripts/build_book.py) are
+        answered from it, unless restricted to `sols` or `opts`.
+
+        Without a limit, words are scored best estimate first until the
+        %budget runs out - starting from about as many as the budget should allow,
+        as measured on this machine.
         """
         game, limit_instr = self._prs(line)
-        limit_instr += f" {auto_limit(len(get_options(game)))}"
+        bits = limit_instr.split()
+        if not bits or bits[0] not in ("sols", "opts"):
+            # an opening book's answers are over every word, so they
+            # beat any ranking of fewer.
+            booked = book.lookup(hashable(game), self.limit)
+            if booked is not None:
+                self._summarize(game)
+                print("From the opening book")
+                return [_format_welim(t) for t in booked]
+
+        budget = None
+        if not any(bit.isdigit() for bit in limit_instr.split()):
+            # the budget is for scoring, and starts once the words are ranked.
+            budget = self.budget
+            # twice the estimate, so that a run going faster than expected
+            # keeps going until the budget runs out.
+            limit_instr += f" {2 * auto_limit(len(get_options(game)), self.budget)}"
 
         return self._best_elim(
             game,
             _instruction_line_to_chosen_wordlist(limit_instr, **all_or_opts_wordlist_creators([game])),
+            budget,
         )
 
+    @line_magic
+    def solve(self, line):
+        """Looks ahead to the end of the game: the guess that solves it in
+        the fewest guesses on average (or, with `worst`, at most), searching
+        for up to the %budget. The whole decision tree is kept in
+        `self.tree`, and saved as JSON if given a path.
+        """
+        game, rest = self._prs(line)
+        words = rest.split()
+        objective: Objective = "worst" if "worst" in words else "expected"
+        paths = [word for word in words if word.endswith(".json")]
+        self._summarize(game)
+        tree = self.tree = solve(hashable(game), objective, budget=self.budget)
+        if paths:
+            save(tree, paths[0])
+        return tree.guess, round(tree.expected, 3), tree.worst
+
     @line_magic
     def be(self, limit):
         return self.best_elim(limit)
@@ -340,6 +398,16 @@ class IpythonCli(Magics):
     def delete(self, game):
         del self.games[int(game)]
 
+    @line_magic
+    def horizon(self, line):
+        """Ranks %cross by boards solved within 1 or 2 guesses; 0 to stop."""
+        if line:
+            if line.strip() not in ("0", "1", "2"):
+                print("The horizon can only be 1 or 2 guesses, or 0 to stop")
+            else:
+                self.horizon = int(line) or None
+        return self.horizon
+
     @line_magic
     def cross(self, line):
         """Cross-elimination uses all games to find a good next guess"""
@@ -351,10 +419,18 @@ class IpythonCli(Magics):
         def fmt_ce(ce):
             solutions = "".join(["🟩" if k in ce.solved else "⬛" for k in self.games.keys()])
             options = "".join(["🟨" if k in ce.option else "⬛" for k in self.games.keys()])
-            return (f"{ce.elim_ratio:8.3f}", solutions, options)
+            scores: tuple[str, ...] = (f"{ce.elim_ratio:8.3f}",)
+            if self.horizon:
+                scores = (f"{ce.expected_solved:6.2f}", *scores)
+            return (*scores, solutions, options)
 
         try:
-            return [(w, *fmt_ce(ce)) for w, ce in elim_across_games(self.games, wordlist)[-self.limit :]]
+            return [
+                (w, *fmt_ce(ce))
+                for w, ce in elim_across_games(
+                    self.games, wordlist, limit=self.limit, progress=True, horizon=self.horizon
+                )
+            ]
         finally:
             elim_store.commit()
 
@@ -1,6 +1,8 @@
+import atexit
+import hashlib
 import os
-import sys
 import typing as ty
+from collections import OrderedDict
 from functools import wraps
 
 from sqlitedict import SqliteDict
@@ -12,32 +14,286 @@ DecoFactory = ty.Callable[..., Deco]
 sb = str | bytes
 
 
-assert sys.flags.hash_randomization == 0, "hash randomization must be disabled for memoization to work"
-assert hash((1,)) == -6644214454873602895, "hash seed must be 0"
+class Store(ty.Protocol):
+    """Where memoized results are kept - a dict, a SqliteDict or a TieredStore."""
+
+    def __getitem__(self, key: sb) -> ty.Any:
+        ...
+
+    def __setitem__(self, key: sb, value: ty.Any) -> None:
+        ...
+
+
+def canonical(obj: ty.Any) -> bytes:
+    """A byte encoding of obj that is the same in every process, unlike
+    the builtin `hash`, which is salted per process for str and bytes.
+
+    Supports None, bools, numbers, str, bytes, and (recursively) tuples,
+    lists, sets and dicts of those. Sets and dicts are encoded in sorted
+    order, so their iteration order does not matter.
+    """
+    if obj is None:
+        return b"N"
+    if isinstance(obj, bool):
+        return b"T" if obj else b"F"
+    if isinstance(obj, int):
+        return b"i%d;" % obj
+    if isinstance(obj, float):
+        return b"f" + obj.hex().encode() + b";"
+    if isinstance(obj, str):
+        obj = obj.encode()
+        return b"s%d:" % len(obj) + obj
+    if isinstance(obj, bytes):
+        return b"b%d:" % len(obj) + obj
+    if isinstance(obj, (tuple, list)):
+        return b"(" + b"".join(canonical(o) for o in obj) + b")"
+    if isinstance(obj, (set, frozenset)):
+        return b"{" + b"".join(sorted(canonical(o) for o in obj)) + b"}"
+    if isinstance(obj, dict):
+        return b"<" + b"".join(sorted(canonical(k) + canonical(v) for k, v in obj.items())) + b">"
+    raise TypeError(f"Cannot canonically encode {type(obj)}: {obj!r}")
+
+
+def digest(*parts: ty.Any) -> str:
+    return hashlib.blake2b(canonical(parts), digest_size=16).hexdigest()
+
+
+def fingerprint(words: ty.Iterable[str]) -> str:
+    """A short stable name for a (large) sequence of words, e.g. an option set."""
+    return hashlib.blake2b("\n".join(words).encode(), digest_size=16).hexdigest()
+
+
+def _base_hash(outer_args: tuple, outer_kwargs: dict) -> ty.Optional[str]:
+    return digest(outer_args, outer_kwargs) if outer_args or outer_kwargs else None
+
+
+def cache_keys(*outer_args: ty.Any) -> ty.Callable[..., str]:
+    """Makes the keys `pickle_cache(db)(*outer_args)(f)(*args)` keeps its
+    results under - for looking results up without calling through f.
+    """
+    # the same as digest(base_hash, args, {}), with everything but the
+    # encoding of args worked out just once.
+    head = b"(" + canonical(_base_hash(outer_args, dict()))
+
+    def key(*args: ty.Any) -> str:
+        return hashlib.blake2b(head + canonical(args) + b"<>)", digest_size=16).hexdigest()
+
+    return key
+
+
+# how many keys go in a statement - with a value each, still under the 999
+# variables older sqlite versions allow in one.
+_BATCH = 499
+
+
+def _get_many(
+    persistent: ty.Mapping[sb, ty.Any], keys: ty.List[sb]
+) -> ty.Iterator[ty.Tuple[sb, ty.Any]]:
+    if not isinstance(persistent, SqliteDict):
+        for key in keys:
+            if key in persistent:
+                yield key, persistent[key]
+        return
+    # one statement per batch, rather than a round trip to sqlite's thread per key.
+    for i in range(0, len(keys), _BATCH):
+        batch = keys[i : i + _BATCH]
+        query = 'SELECT key, value FROM "%s" WHERE key IN (%s)' % (
+            persistent.tablename,
+            ",".join("?" * len(batch)),
+        )
+        for key, value in persistent.conn.select(query, [persistent.encode_key(k) for k in batch]):
+            yield persistent.decode_key(key), persistent.decode(value)
+
+
+def _put_many(persistent: ty.MutableMapping[sb, ty.Any], items: ty.Dict[sb, ty.Any]) -> None:
+    if not isinstance(persistent, SqliteDict):
+        persistent.update(items)
+        return
+    rows = [(persistent.encode_key(key), persistent.encode(value)) for key, value in items.items()]
+    for i in range(0, len(rows), _BATCH):
+        batch = rows[i : i + _BATCH]
+        statement = 'REPLACE INTO "%s" (key, value) VALUES %s' % (
+            persistent.tablename,
+            ",".join(["(?,?)"] * len(batch)),
+        )
+        persistent.conn.execute(statement, [field for row in batch for field in row])
+
+
+class TierStats(ty.NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    persistent_hits: int
+    persistent_misses: int
+    flushes: int
+    pending: int
+
+
+class TieredStore:
+    """A bounded in-process LRU in front of a persistent mapping.
+
+    New entries go into the LRU immediately, but are only written to
+    the persistent mapping in batches - every `flush_every` new entries
+    and whenever `commit` is called - each batch in a single
+    transaction. The persistent mapping is not opened until it is first
+    needed, so merely importing this module touches no files.
+    """
+
+    def __init__(
+        self,
+        open_persistent: ty.Callable[[], ty.MutableMapping[sb, ty.Any]],
+        max_size: int = 200_000,
+        flush_every: int = 5000,
+    ):
+        self._open_persistent = open_persistent
+        self._persistent: ty.Optional[ty.MutableMapping[sb, ty.Any]] = None
+        self.max_size = max_size
+        self.flush_every = flush_every
+        self._lru: OrderedDict[sb, ty.Any] = OrderedDict()
+        self._pending: dict[sb, ty.Any] = dict()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._persistent_hits = 0
+        self._persistent_misses = 0
+        self._flushes = 0
+
+    @property
+    def persistent(self) -> ty.MutableMapping[sb, ty.Any]:
+        if self._persistent is None:
+            self._persistent = self._open_persistent()
+        return self._persistent
+
+    def _remember(self, key: sb, value: ty.Any) -> None:
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+            self._evictions += 1
+
+    def lookup(self, key: sb) -> ty.Tuple[str, ty.Any]:
+        """The value for key, along with the name of the tier that had it."""
+        try:
+            value = self._lru[key]
+            self._lru.move_to_end(key)
+            self._hits += 1
+            return "memory", value
+        except KeyError:
+            self._misses += 1
+        try:
+            value = self.persistent[key]
+        except KeyError:
+            self._persistent_misses += 1
+            raise
+        self._persistent_hits += 1
+        self._remember(key, value)
+        return "persistent", value
+
+    def lookup_many(self, keys: ty.Iterable[sb]) -> ty.Dict[sb, ty.Any]:
+        """The values for whichever of the keys are kept, the ones not in
+        memory fetched from the persistent mapping all together.
+        """
+        found = dict()
+        missing = list()
+        for key in keys:
+            try:
+                found[key] = self._lru[key]
+                self._lru.move_to_end(key)
+                self._hits += 1
+            except KeyError:
+                self._misses += 1
+                missing.append(key)
+        if missing:
+            fetched = 0
+            for key, value in _get_many(self.persistent, missing):
+                found[key] = value
+                fetched += 1
+                self._remember(key, value)
+            self._persistent_hits += fetched
+            self._persistent_misses += len(missing) - fetched
+        return found
+
+    def __getitem__(self, key: sb) -> ty.Any:
+        return self.lookup(key)[1]
+
+    def __setitem__(self, key: sb, value: ty.Any) -> None:
+        self._remember(key, value)
+        self._pending[key] = value
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        persistent = self.persistent
+        _put_many(persistent, self._pending)
+        commit = getattr(persistent, "commit", None)
+        if commit:
+            commit()
+        self._pending.clear()
+        self._flushes += 1
+
+    def commit(self) -> None:
+        self.flush()
+
+    def clear(self) -> None:
+        """Forgets everything, pending, in memory and persistent."""
+        self._lru.clear()
+        self._pending.clear()
+        persistent = self.persistent
+        persistent.clear()
+        commit = getattr(persistent, "commit", None)
+        if commit:
+            commit()
+
+    @property
+    def stats(self) -> TierStats:
+        return TierStats(
+            self._hits,
+            self._misses,
+            self._evictions,
+            self._persistent_hits,
+            self._persistent_misses,
+            self._flushes,
+            len(self._pending),
+        )
+
+
+class HitRate(ty.NamedTuple):
+    overall: float
+    memory: float
+    persistent: float
 
 
 class Memoizing:
-    def __init__(self, db: ty.MutableMapping[sb, bytes], base_hash: ty.Hashable, f: F):
+    def __init__(self, db: Store, base_hash: ty.Optional[str], f: F):
         self.db = db
         self.base_hash = base_hash
         self.f = f
 
         self._misses = 0
         self._tot = 0
+        self._memory_hits = 0
+
+    def _lookup(self, key: str) -> ty.Any:
+        if isinstance(self.db, TieredStore):
+            tier, result = self.db.lookup(key)
+            if tier == "memory":
+                self._memory_hits += 1
+            return result
+        return self.db[key]
 
     def __call__(self, *args, **kwargs):
         self._tot += 1
         db, base_hash, f = self.db, self.base_hash, self.f
         try:
-            tup = (args, tuple(kwargs.items()))
-            if base_hash is not None:
-                tup = (base_hash, *tup)  # type: ignore
-            composite_hash = str(hash(tup))
+            composite_hash = digest(base_hash, args, kwargs)
         except TypeError:
             print("Failed to hash: ", args, kwargs)
             raise
         try:
-            return db[composite_hash]
+            return self._lookup(composite_hash)
         except KeyError:
             result = f(*args, **kwargs)
             db[composite_hash] = result
@@ -49,25 +305,29 @@ class Memoizing:
         return self._tot - self._misses
 
     @property
-    def hit_rate(self) -> float:
-        return self.hits / self._tot
+    def hit_rate(self) -> HitRate:
+        """Overall, and for each tier - where the in-memory tier only
+        exists if the db is a TieredStore.
+        """
+        return HitRate(
+            self.hits / self._tot,
+            self._memory_hits / self._tot,
+            (self.hits - self._memory_hits) / self._tot,
+        )
 
 
-def pickle_cache(db: ty.MutableMapping[sb, bytes]) -> DecoFactory:
+def pickle_cache(db: Store) -> DecoFactory:
     """Memoize very expensive functions across multiple runs of the
     same program.
 
-    All arguments to the decorated function must be recursively
-    hashable with the builtin `hash` function, and its return value
-    must be pickleable.
+    All arguments to the decorated function (and to the decorator
+    factory) must be encodable by `canonical`, and its return value
+    must be pickleable. Keys are digests of that encoding, so they are
+    the same for every process that computes them.
     """
 
     def deco_factory(*outer_args, **outer_kwargs) -> Deco:
-        if outer_args or outer_kwargs:
-            outer = (outer_args, tuple(outer_kwargs.items()))
-            base_hash = hash(outer)
-        else:
-            base_hash = None
+        base_hash = _base_hash(outer_args, outer_kwargs)
 
         def deco(f: F) -> F:
             return ty.cast(F, wraps(f)(Memoizing(db, base_hash, f)))
@@ -77,9 +337,12 @@ def pickle_cache(db: ty.MutableMapping[sb, bytes]) -> DecoFactory:
     return deco_factory
 
 
-elim_store = SqliteDict(
-    "eldrow_elim_store.sqlite",
-    outer_stack=False,
-    autocommit=not bool(os.getenv("ELDROW_SINGLETHREADED")),
+elim_store = TieredStore(
+    lambda: SqliteDict(
+        os.getenv("ELDROW_ELIM_STORE", "eldrow_elim_store.sqlite"), outer_stack=False, autocommit=False
+    ),
+    max_size=int(os.getenv("ELDROW_CACHE_SIZE", 200_000)),
+    flush_every=int(os.getenv("ELDROW_FLUSH_EVERY", 5000)),
 )
+atexit.register(elim_store.commit)
 elim_cache = pickle_cache(elim_store)
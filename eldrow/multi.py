@@ -1,63 +1,142 @@
+import multiprocessing
 import os
 import typing as ty
-from collections import defaultdict
-from functools import partial, reduce
-from multiprocessing import Pool
+from collections import Counter, defaultdict
+from functools import lru_cache
 
-from .elimination import DataForOptionsAfterGuess, elimination_scorer
-from .game import Game, HashableGame, get_options, hashable, novel_or_option, novelty
-from .words import five_letter_word_list
+from . import parallel, words
+from .elimination import (
+    ELIMINATION_SCORER_VERSION,
+    elimination_keys,
+    equivalence_classes,
+    sampled_elimination_estimator,
+)
+from .game import Game, HashableGame, get_options, novel_or_option, novelty
+from .memoize import cache_keys, elim_store, fingerprint
+from .patterns import EncodedWords, answers, encode_words
+from .progress import Progress, TopK, collect
 
 _DEFAULT_WORDLIST_LIMIT = int(os.getenv("ELDROW_WORDLIST_LIMIT", 12973))
 
 
-class CrossElim(ty.NamedTuple):
+class GameCrossElim(ty.NamedTuple):
+    elim_ratio: float
+    solved: set[str]
+    option: set[str]
+    # how many boards this guess can expect to solve within the horizon - see `_board_stats`.
+    expected_solved: float = 0.0
+
+
+class _BoardStats(ty.NamedTuple):
     elim_ratio: float
     solved: bool
     option: bool
+    within_1: float  # the chance the guess solves the board
+    within_2: float  # ...or that the next guess can, by being the only option left
 
 
-def elim_game(candidates: tuple[str, ...], game: HashableGame) -> ty.Dict[str, CrossElim]:
-    opts_tuple = get_options(game)
-    nc = len(candidates)
-    elim_scorer = elimination_scorer(
-        opts_tuple, DataForOptionsAfterGuess(game.alpha, opts_tuple, game.guesses)
+def _board_stats(elim_count: float, buckets: int, n: int, option: bool) -> _BoardStats:
+    """From the elimination score `elimination_scorer` gives the word, and
+    the number of pattern buckets it splits the board's n options into.
+    """
+    return _BoardStats(
+        (elim_count + 1) / n if n != 1 else 1.0,
+        elim_count >= n - 1,
+        option,
+        option / n,
+        # each bucket is solved next guess for certain if it's the solution itself,
+        # or with a chance of one in its size.
+        buckets / n,
     )
-    cross_game_elimination_multipliers = dict()
-    options_set = set(opts_tuple)
-    for i, word in enumerate(candidates):
-        elim_count = elim_scorer(word)
-        game_elim_ratio = (elim_count + 1) / len(opts_tuple)
-        cross_game_elimination_multipliers[word] = CrossElim(
-            (game_elim_ratio if len(opts_tuple) != 1 else 1.0),
-            elim_count >= len(opts_tuple) - 1,
-            word in options_set,
-        )
-        left = nc - i
-        if left % 1000 == 0:
-            print(f"{left} words left against {len(opts_tuple)} options")
-    print(f"finished with {len(opts_tuple)} options")
-    return cross_game_elimination_multipliers
 
 
-class GameCrossElim(ty.NamedTuple):
-    elim_ratio: float
-    solved: set[str]
-    option: set[str]
+@lru_cache(maxsize=8)
+def _union(
+    segments: ty.Tuple[parallel.SharedWords, ...]
+) -> ty.Tuple[EncodedWords, ty.Tuple[slice, ...], ty.Tuple[str, ...]]:
+    """Every board's options in one encoding, each board a slice of it -
+    so that a candidate's patterns against all of them take one pass -
+    along with the fingerprint each board's scores are cached under.
+    """
+    every_opt: ty.List[str] = list()
+    slices = list()
+    fingerprints = list()
+    for segment in segments:
+        opts = parallel.words(segment)
+        slices.append(slice(len(every_opt), len(every_opt) + len(opts)))
+        fingerprints.append(fingerprint(sorted(opts)))
+        every_opt.extend(opts)
+    return encode_words(every_opt), tuple(slices), tuple(fingerprints)
 
 
-def _p_elim_game(
-    candidates: tuple[str, ...], key_game: ty.Tuple[str, Game]
+def _p_cross_elims(
+    candidates: parallel.SharedWords,
+    start: int,
+    stop: int,
+    boards: ty.Tuple[ty.Tuple[ty.Any, int], ...],
+    segments: ty.Tuple[parallel.SharedWords, ...],
+    horizon: int,
 ) -> ty.Dict[str, GameCrossElim]:
-    key, game = key_game
-    return {
-        word: GameCrossElim(
-            ce.elim_ratio,
-            {key} if ce.solved else set(),
-            {key} if ce.option else set(),
-        )
-        for word, ce in elim_game(candidates, hashable(game)).items()
-    }
+    """Every candidate scored against every board, where each board is a
+    (key, index into segments) - boards with the same options share one.
+
+    Each board's scores are cached in `elim_store` alongside the ones
+    `elimination_scorer` keeps, so only the words missing from it for
+    some board have their patterns worked out.
+    """
+    encoded, slices, fingerprints = _union(segments)
+    segment_opts = [encoded.words[s] for s in slices]
+    segment_sets = [set(opts) for opts in segment_opts]
+    chunk = parallel.words(candidates)[start:stop]
+    elim_keys = [elimination_keys(fp) for fp in fingerprints]
+    keys = {word: [key(word) for key in elim_keys] for word in chunk}
+    # the bucket counts are only needed to look two guesses ahead.
+    buckets_keys = [cache_keys(ELIMINATION_SCORER_VERSION, "buckets", fp) for fp in fingerprints]
+    bucket_keys = {word: [key(word) if horizon == 2 else "" for key in buckets_keys] for word in chunk}
+    cached = elim_store.lookup_many(
+        [key for word in chunk for key in (*keys[word], *bucket_keys[word]) if key]
+    )
+    results = dict()
+    try:
+        for word in chunk:
+            # None until looked up or worked out
+            counts: ty.List[ty.Any] = [cached.get(key) for key in keys[word]]
+            buckets: ty.List[ty.Any] = [cached.get(key) if key else 0 for key in bucket_keys[word]]
+            if None in counts or None in buckets:
+                codes = answers(word, encoded)
+                for i, (s, opts_set) in enumerate(zip(slices, segment_sets)):
+                    if counts[i] is not None and buckets[i] is not None:
+                        continue
+                    n = s.stop - s.start
+                    sizes = Counter(codes[s]).values()
+                    counts[i] = round(
+                        (n * n - sum(size * size for size in sizes) + (word in opts_set)) / n, 3
+                    )
+                    buckets[i] = len(sizes)
+                    elim_store[keys[word][i]] = counts[i]
+                    if bucket_keys[word][i]:
+                        elim_store[bucket_keys[word][i]] = buckets[i]
+            stats = [
+                _board_stats(count, n_buckets, len(opts), word in opts_set)
+                for count, n_buckets, opts, opts_set in zip(counts, buckets, segment_opts, segment_sets)
+            ]
+            elim_ratio, expected_solved = 1.0, 0.0
+            solved, option = set(), set()
+            # multiplied in board order, so the ratios multiply out the same every time
+            for key, segment in boards:
+                board = stats[segment]
+                elim_ratio *= board.elim_ratio
+                expected_solved += board.within_1 if horizon == 1 else board.within_2
+                if board.solved:
+                    solved.add(key)
+                if board.option:
+                    option.add(key)
+            results[word] = GameCrossElim(elim_ratio, solved, option, round(expected_solved, 6))
+    finally:
+        # the parent commits what it scored itself once it's done.
+        if multiprocessing.parent_process() is not None:
+            elim_store.commit()
+    return results
 
 
 def _all_options(*games: Game) -> ty.Set[str]:
@@ -91,6 +170,33 @@ def _best_novelty_words_across_games(
     ]
 
 
+def _best_sampled_words_across_games(
+    games: ty.Collection[Game | HashableGame],
+    limit: int,
+    wordlist: ty.Collection[str],
+) -> ty.List[str]:
+    """The words with the best estimated elimination ratio across all the
+    games, best first - see `sampled_elimination_estimator`. Unlike novelty,
+    this finds the words that elimination scoring would pick, to within
+    what `scripts/inspect_elims.py` measures.
+    """
+    candidates = list(dict.fromkeys(wordlist))
+    cross_game_ratios = [1.0] * len(candidates)
+    for game in games:
+        opts = get_options(game)
+        if not opts:
+            continue
+        estimator = sampled_elimination_estimator(opts)
+        for members in equivalence_classes(candidates, opts):
+            ratio = (estimator(candidates[members[0]]) + 1) / len(opts)
+            for i in members:
+                cross_game_ratios[i] *= ratio
+
+    return [w for w, s in sorted(zip(candidates, cross_game_ratios), key=lambda t: t[1], reverse=True)][
+        :limit
+    ]
+
+
 def all_or_opts_wordlist_creators(games: ty.Collection[Game]) -> dict[str, ty.Callable[..., list[str]]]:
     def best_sols(limit: int = _DEFAULT_WORDLIST_LIMIT):
         return _best_novelty_words_across_games(games, limit, _all_novel(limit, *games))
@@ -98,41 +204,67 @@ def all_or_opts_wordlist_creators(games: ty.Collection[Game]) -> dict[str, ty.Ca
     def best_opts(limit: int = _DEFAULT_WORDLIST_LIMIT):
         return _best_novelty_words_across_games(games, limit, _all_options(*games))
 
+    def best_novel(limit: int = 0):
+        if not limit:
+            return words.five_letter_word_list
+        return _best_novelty_words_across_games(games, limit, words.five_letter_word_list)
+
     def best_all(limit: int = 0):
         if not limit:
-            return five_letter_word_list
-        return _best_novelty_words_across_games(games, limit, five_letter_word_list)
+            return words.five_letter_word_list
+        return _best_sampled_words_across_games(games, limit, words.five_letter_word_list)
 
-    return dict(default=best_all, sols=best_sols, opts=best_opts)
+    return dict(default=best_all, sols=best_sols, opts=best_opts, novel=best_novel)
 
 
-def _merge_game_cross_elims(
-    a: ty.Dict[str, GameCrossElim], b: ty.Dict[str, GameCrossElim]
-) -> ty.Dict[str, GameCrossElim]:
-    assert set(a) == set(b)
+def elim_across_games(
+    games: ty.Dict[ty.Any, Game],
+    wordlist: ty.Collection[str],
+    limit: ty.Optional[int] = None,
+    progress: bool = False,
+    horizon: ty.Optional[int] = None,
+) -> ty.List[ty.Tuple[str, GameCrossElim]]:
+    """Only the best `limit` are kept (all of them if limit is None), best
+    last. Ctrl-C returns the best of the candidates scored so far.
 
-    def merge(ac: GameCrossElim, bc: GameCrossElim) -> GameCrossElim:
-        return GameCrossElim(ac.elim_ratio * bc.elim_ratio, ac.solved | bc.solved, ac.option | bc.option)
+    With a horizon of 1 or 2, words are ranked first by how many boards
+    they can expect to solve within that many guesses. For 2, each board
+    is assumed to get the next guess to itself, so it's an upper bound
+    across several boards.
+    """
+    assert horizon in (None, 1, 2), "Boards solved can only be looked for 1 or 2 guesses ahead"
+    # boards with the same options (e.g. every board, before the first
+    # guess) are scored once; only small handles to the candidates and
+    # each distinct option set are sent to the workers.
+    candidates = tuple(dict.fromkeys(wordlist))
+    chunks = parallel.ranges(len(candidates), parallel.workers() * 4)
+    keys = list(games)
+    board_opts = {key: get_options(games[key]) for key in keys}
+    distinct = list(dict.fromkeys(board_opts.values()))
+    boards = tuple((key, distinct.index(board_opts[key])) for key in keys)
+    game_wordlist = set(list(games.values())[0].wl)
+    index = {word: i for i, word in enumerate(candidates)}
 
-    return {word: merge(a[word], b[word]) for word in a}
+    def rank(w_ce: ty.Tuple[str, GameCrossElim]) -> tuple:
+        word, ce = w_ce
+        # ties go to words in the game's word list, then to whichever comes later.
+        ranked = len(ce.solved), ce.elim_ratio, len(ce.option), word in game_wordlist, index[word]
+        return (ce.expected_solved, *ranked) if horizon else ranked
 
+    def results(tasks: ty.List[tuple]) -> ty.Iterator[ty.Tuple[int, ty.Iterable, int]]:
+        for _task, elims in parallel.imap(_p_cross_elims, tasks):
+            yield len(elims), elims.items(), 0
 
-def elim_across_games(
-    games: ty.Dict[ty.Any, Game], wordlist: ty.Collection[str]
-) -> ty.List[ty.Tuple[str, GameCrossElim]]:
-    wordlist_t = tuple(wordlist)
-    with Pool(len(games)) as pool:
-        cross_game_elimination_multipliers = reduce(
-            _merge_game_cross_elims, pool.map(partial(_p_elim_game, wordlist_t), games.items())
+    top: TopK[ty.Tuple[str, GameCrossElim]] = TopK(limit, rank)
+    with parallel.shared_words(candidates, *distinct) as (shared_candidates, *segments):
+        tasks = [
+            (shared_candidates, r.start, r.stop, boards, tuple(segments), horizon or 1) for r in chunks
+        ]
+        collect(
+            results(tasks),
+            top,
+            Progress(len(candidates), describe=lambda w_ce: f"{w_ce[0]} {w_ce[1].elim_ratio:.3f}")
+            if progress
+            else None,
         )
-
-    game_wordlist = set(list(games.values())[0].wl)
-    words_onto_cross_elims = cross_game_elimination_multipliers.items()
-    sorted_by_in_wl = sorted(
-        words_onto_cross_elims, key=lambda w_ce: 1 if w_ce[0] in game_wordlist else 0
-    )
-    sorted_by_options = sorted(sorted_by_in_wl, key=lambda kv: len(kv[1].option))
-    sorted_by_solving = sorted(sorted_by_options, key=lambda kv: len(kv[1].solved))
-    return sorted(
-        sorted_by_solving, key=lambda kv: (len(kv[1].solved), kv[1].elim_ratio, len(kv[1].option))
-    )
+    return top.sorted()
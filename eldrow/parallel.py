@@ -0,0 +1,154 @@
+"""A process pool shared by every command.
+
+The pool is sized to the machine rather than to the work, and started
+once and reused, since starting workers (and warming their caches) is a
+large part of the cost of a short command.
+
+Workers are spawned rather than forked: forking a process that already
+has the SQLite store's background thread running leaves the children
+with a connection nothing is serving. Workers ignore Ctrl-C, so that
+interrupting a command is handled once, in the parent, which can then
+keep whatever results it already has and throw the pool away.
+
+Large, read-only inputs (word lists, option sets) are handed to workers
+as memory-mapped files, so that a task is only a few small handles and
+each worker decodes a given list once, however many tasks use it.
+Plain files are used rather than multiprocessing.shared_memory because
+every process that attaches to a shared memory block also registers it
+with the resource tracker, which then tries to clean it up more than once.
+"""
+import atexit
+import hashlib
+import math
+import multiprocessing
+import os
+import signal
+import tempfile
+import typing as ty
+from collections import OrderedDict
+from contextlib import contextmanager
+from mmap import ACCESS_READ, mmap
+from multiprocessing.pool import Pool
+
+T = ty.TypeVar("T")
+R = ty.TypeVar("R")
+
+_SINGLETHREADED = bool(os.getenv("ELDROW_SINGLETHREADED"))
+
+_POOL: ty.Optional[Pool] = None
+
+
+def workers() -> int:
+    return int(os.getenv("ELDROW_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def pool() -> ty.Optional[Pool]:
+    """The shared pool, or None if work should be done in this process."""
+    global _POOL
+    if _SINGLETHREADED or workers() == 1:
+        return None
+    if _POOL is None:
+        _POOL = multiprocessing.get_context("spawn").Pool(workers(), initializer=_ignore_sigint)
+        atexit.register(shutdown)
+    return _POOL
+
+
+def _ignore_sigint() -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def shutdown() -> None:
+    global _POOL
+    if _POOL is not None:
+        _POOL.terminate()
+        _POOL.join()
+        _POOL = None
+
+
+def ranges(n: int, n_chunks: int) -> ty.List[range]:
+    """Splits range(n) into at most n_chunks contiguous, nearly equal ranges."""
+    size = max(1, math.ceil(n / max(1, n_chunks)))
+    return [range(i, min(n, i + size)) for i in range(0, n, size)]
+
+
+def chunked(items: ty.Sequence[T], n_chunks: int) -> ty.List[ty.Tuple[T, ...]]:
+    """Splits items into at most n_chunks contiguous, nearly equal chunks."""
+    return [tuple(items[r.start : r.stop]) for r in ranges(len(items), n_chunks)]
+
+
+def imap(
+    f: ty.Callable[..., R], tasks: ty.Iterable[ty.Tuple], workers: ty.Optional[int] = None
+) -> ty.Iterator[ty.Tuple[ty.Tuple, R]]:
+    """Runs the tasks on the shared pool, or in order in this process
+    when there is no pool or workers=1, yielding (task, result) as each
+    task finishes, in whatever order they finish.
+
+    Tasks are only taken from `tasks` as they are needed - in this
+    process, each once the one before it has been yielded.
+    """
+    the_pool = pool() if workers != 1 else None
+    if the_pool is None:
+        for task in tasks:
+            yield task, f(*task)
+        return
+    submitted: ty.Dict[int, ty.Tuple] = dict()
+
+    def indexed() -> ty.Iterator[ty.Tuple[int, ty.Callable, ty.Tuple]]:
+        for i, task in enumerate(tasks):
+            submitted[i] = task
+            yield i, f, task
+
+    for i, result in the_pool.imap_unordered(_star_indexed, indexed()):
+        yield submitted.pop(i), result
+
+
+def _star_indexed(args: ty.Tuple[int, ty.Callable, ty.Tuple]) -> ty.Tuple[int, ty.Any]:
+    i, f, task = args
+    return i, f(*task)
+
+
+class SharedWords(ty.NamedTuple):
+    """A handle to a word list that any process on this machine can read."""
+
+    path: str
+    size: int
+    digest: str  # so that a reused path is never mistaken for an already decoded list
+
+
+@contextmanager
+def shared_words(*word_lists: ty.Sequence[str]) -> ty.Iterator[ty.Tuple[SharedWords, ...]]:
+    """Makes each word list readable by workers for as long as the context lasts."""
+    handles: ty.List[SharedWords] = list()
+    try:
+        for words in word_lists:
+            data = "\n".join(words).encode()
+            fd, path = tempfile.mkstemp(prefix="eldrow-", suffix=".words")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            handles.append(
+                SharedWords(path, len(data), hashlib.blake2b(data, digest_size=16).hexdigest())
+            )
+        yield tuple(handles)
+    finally:
+        for handle in handles:
+            os.unlink(handle.path)
+
+
+_ATTACHED: OrderedDict[SharedWords, ty.Tuple[str, ...]] = OrderedDict()
+_MAX_ATTACHED = 16
+
+
+def words(handle: SharedWords) -> ty.Tuple[str, ...]:
+    """The word list behind a handle, decoded once per process."""
+    if handle in _ATTACHED:
+        _ATTACHED.move_to_end(handle)
+        return _ATTACHED[handle]
+    if handle.size:
+        with open(handle.path, "rb") as f, mmap(f.fileno(), 0, access=ACCESS_READ) as mapped:
+            decoded = tuple(mapped[: handle.size].decode().split("\n"))
+    else:
+        decoded = tuple()
+    _ATTACHED[handle] = decoded
+    while len(_ATTACHED) > _MAX_ATTACHED:
+        _ATTACHED.popitem(last=False)
+    return decoded
@@ -1,4 +1,3 @@
-import string
 import typing as ty
 
 POS_TYPE = ty.Literal[
@@ -29,7 +28,7 @@ def _paren_yellow_parse(guess: str) -> ty.Iterator[Pos]:
             if yellow_count:
                 yellow_count -= 1
                 yield "yellow", c.lower()
-            elif c in string.ascii_uppercase:
+            elif c.isupper():
                 yield "green", c.lower()
             else:
                 yield "gray", c
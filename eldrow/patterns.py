@@ -0,0 +1,199 @@
+"""Feedback patterns encoded as small integers.
+
+Every position contributes one base-3 digit - gray, yellow or green -
+with position 0 as the least significant digit, so any pattern for a
+five letter word fits in a single byte (0..242).
+
+`answers` finds the patterns for one guess against a whole list of
+solutions at once. Each solution gets one byte-wide lane of a big
+Python int, and each position of every solution is held as a column of
+character codes (see alphabet), so comparing a guess letter against a position of
+every solution is a single `bytes.translate`, and combining per-lane
+results is plain integer arithmetic - as long as no lane ever leaves
+0..255, nothing carries or borrows between lanes.
+"""
+import typing as ty
+from functools import cache
+from operator import itemgetter
+
+from . import words
+from .alphabet import MAX_SYMBOLS, Alphabet, alphabet_of
+
+GRAY, YELLOW, GREEN = 0, 1, 2
+
+
+def solved(n: int) -> int:
+    """The all-green pattern for words of length n."""
+    return 3**n - 1
+
+
+def pattern(solution: str, guess: str) -> int:
+    unmatched: dict[str, int] = dict()
+    for guess_c, c in zip(guess, solution):
+        if guess_c != c:
+            unmatched[c] = unmatched.get(c, 0) + 1
+
+    code = 0
+    weight = 1
+    for guess_c, c in zip(guess, solution):
+        if guess_c == c:
+            code += GREEN * weight
+        elif unmatched.get(guess_c):
+            code += YELLOW * weight
+            unmatched[guess_c] -= 1
+        weight *= 3
+    return code
+
+
+def pattern_to_guess(guess: str, code: int) -> str:
+    """The paren-yellow representation of the pattern for a guess, e.g.
+    B(OR)oN for 'boron' when the solution is 'brown'.
+    """
+    results = list()
+    is_yellow = False
+    for c in guess:
+        color = code % 3
+        code //= 3
+        if color == YELLOW and not is_yellow:
+            results.append("(")
+        elif color != YELLOW and is_yellow:
+            results.append(")")
+        is_yellow = color == YELLOW
+        results.append(c.lower() if color == GRAY else c.upper())
+    if is_yellow:
+        results.append(")")
+    return "".join(results)
+
+
+class EncodedWords(ty.NamedTuple):
+    words: ty.Tuple[str, ...]
+    # the character codes at each position, one byte per word - or none at
+    # all, if the words aren't all the same length or have too many symbols.
+    columns: ty.Tuple[bytes, ...]
+    ones: int  # a 1 in every lane
+    alphabet: Alphabet
+
+
+def encode_words(words: ty.Sequence[str], alphabet: ty.Optional[Alphabet] = None) -> EncodedWords:
+    words = tuple(words)
+    alphabet = alphabet or alphabet_of(words)
+    ones = int.from_bytes(b"\x01" * len(words), "little")
+    n = len(words[0]) if words else 0
+    if len(alphabet.symbols) > MAX_SYMBOLS or any(len(w) != n for w in words):
+        return EncodedWords(words, (), ones, alphabet)
+    codes = alphabet.encode("".join(words))
+    return EncodedWords(words, tuple(codes[i::n] for i in range(n)), ones, alphabet)
+
+
+@cache
+def _is(code: int) -> bytes:
+    """A translation table mapping the code to 1 and everything else to 0."""
+    table = bytearray(256)
+    table[code] = 1
+    return bytes(table)
+
+
+def answers(guess: str, solutions: ty.Sequence[str] | EncodedWords) -> ty.Sequence[int]:
+    """The pattern code for the guess against each solution, in order.
+
+    Repeated letters follow the usual rules: greens are claimed first,
+    and the remaining copies of a letter in the solution turn the
+    earliest other copies in the guess yellow.
+    """
+    encoded = solutions if isinstance(solutions, EncodedWords) else encode_words(solutions)
+    n = len(guess)
+    if not encoded.columns or len(encoded.columns) != n or solved(n) > 255:
+        return [pattern(s, guess) for s in encoded.words]
+    codes = encoded.alphabet.codes
+
+    def lanes(pos: int, c: str) -> int:
+        if c not in codes:
+            return 0  # in none of the solutions
+        return int.from_bytes(encoded.columns[pos].translate(_is(codes[c])), "little")
+
+    ones = encoded.ones
+    green = [lanes(i, c) for i, c in enumerate(guess)]
+    code = sum(GREEN * 3**i * green[i] for i in range(n))
+    for c in set(guess):
+        count = sum(lanes(i, c) for i in range(n))
+        positions = [i for i, guess_c in enumerate(guess) if guess_c == c]
+        for before, i in enumerate(positions):
+            # a non-green copy is yellow if the solution has more copies than
+            # the greens still to come plus the copies before this one.
+            # adding 127 puts the high bit of each lane exactly where
+            # count >= before + greens_after + 1.
+            greens_after = sum(green[j] for j in positions[before + 1 :])
+            at_least = ((count + (127 - before) * ones - greens_after) >> 7) & ones
+            code += 3**i * (at_least & (ones ^ green[i]))
+    return code.to_bytes(len(encoded.words), "little")
+
+
+def _take(row: ty.Sequence[int], columns: ty.Tuple[int, ...]) -> ty.Tuple[int, ...]:
+    return itemgetter(*columns)(row) if len(columns) > 1 else (row[columns[0]],)
+
+
+class PatternMatrix:
+    """A guess x solution table of pattern codes, one byte per pair.
+
+    Rows are filled the first time they are asked for, since a session
+    usually only scores a fraction of the guesses and filling all of
+    them up front takes longer than most commands.
+    """
+
+    def __init__(self, guesses: ty.Sequence[str], solutions: ty.Sequence[str]):
+        assert solved(len(solutions[0])) <= 255, "patterns must fit in a byte"
+        self.guesses = tuple(guesses)
+        self.solutions = encode_words(solutions)
+        self._guess_index = {w: i for i, w in enumerate(self.guesses)}
+        self._solution_index = {w: i for i, w in enumerate(self.solutions.words)}
+        self._matrix = bytearray(len(self.guesses) * len(self.solutions.words))
+        self._filled = bytearray(len(self.guesses))
+
+    def row(self, guess: str) -> memoryview:
+        i = self._guess_index[guess]
+        n = len(self.solutions.words)
+        if not self._filled[i]:
+            self._matrix[i * n : (i + 1) * n] = answers(guess, self.solutions)
+            self._filled[i] = 1
+        return memoryview(self._matrix)[i * n : (i + 1) * n]
+
+    def columns(self, solutions: ty.Iterable[str]) -> ty.Optional[ty.Tuple[int, ...]]:
+        """Positions of the given solutions within each row, or None if
+        any of them is not covered by this matrix.
+        """
+        try:
+            return tuple(self._solution_index[s] for s in solutions)
+        except KeyError:
+            return None
+
+    def patterns(
+        self,
+        guess: str,
+        solutions: ty.Sequence[str] | EncodedWords,
+        columns: ty.Optional[ty.Tuple[int, ...]] = None,
+    ) -> ty.Sequence[int]:
+        """Pattern codes for the guess against each of the solutions,
+        which must be the solutions at `columns` if those are given.
+        Pass the solutions already encoded when calling this repeatedly.
+        """
+        if columns is None or not columns or guess not in self._guess_index:
+            return answers(guess, solutions)
+        if not self._filled[self._guess_index[guess]] and len(columns) * 4 < len(self._solution_index):
+            # a handful of solutions is cheaper to do directly than a whole row.
+            return answers(guess, solutions)
+        return _take(self.row(guess), columns)
+
+
+def pattern_matrix(
+    guesses: ty.Optional[ty.Tuple[str, ...]] = None, solutions: ty.Optional[ty.Tuple[str, ...]] = None
+) -> PatternMatrix:
+    """One matrix per pair of lists - by default, every word against every solution."""
+    return _pattern_matrix(
+        guesses if guesses is not None else words.five_letter_word_list,
+        solutions if solutions is not None else words.sols,
+    )
+
+
+@cache
+def _pattern_matrix(guesses: ty.Tuple[str, ...], solutions: ty.Tuple[str, ...]) -> PatternMatrix:
+    return PatternMatrix(guesses, solutions)
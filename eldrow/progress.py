@@ -0,0 +1,131 @@
+"""Keeping the best results of a long scoring run while it is still going.
+
+Scores come back from the pool a chunk at a time; only the best `k` of
+them are kept, in a heap, and a one-line progress report (with the best
+result so far) is redrawn as they arrive. If the run is interrupted
+with Ctrl-C, the best results so far are still there to be returned.
+"""
+import heapq
+import sys
+import time
+import typing as ty
+
+from . import parallel
+
+T = ty.TypeVar("T")
+
+
+class TopK(ty.Generic[T]):
+    """The `k` items with the greatest keys, or every item if k is None."""
+
+    def __init__(self, k: ty.Optional[int], key: ty.Callable[[T], ty.Any]):
+        self.k = k
+        self.key = key
+        self._heap: ty.List[ty.Tuple[ty.Any, int, T]] = list()
+        self._pushed = 0
+
+    def push(self, item: T) -> None:
+        # the push count breaks ties, so items themselves are never compared
+        entry = (self.key(item), self._pushed, item)
+        self._pushed += 1
+        if self.k is None or len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[0] > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def last(self) -> ty.Optional[T]:
+        """The item the next one has to beat to be kept - None until there are k."""
+        if self.k is None or len(self._heap) < self.k:
+            return None
+        return self._heap[0][2]
+
+    def best(self) -> ty.Optional[T]:
+        return max(self._heap, key=lambda entry: entry[0])[2] if self._heap else None
+
+    def sorted(self) -> ty.List[T]:
+        """Ascending, so that the best is last."""
+        return [item for _key, _i, item in sorted(self._heap, key=lambda entry: entry[0])]
+
+
+class Progress:
+    """A progress line, redrawn in place at most every `every` seconds."""
+
+    def __init__(
+        self,
+        total: int,
+        what: str = "words",
+        describe: ty.Callable[[ty.Any], str] = str,
+        every: float = 0.5,
+        out: ty.TextIO = sys.stderr,
+    ):
+        self.total = total
+        self.what = what
+        self.describe = describe
+        self.every = every
+        self.out = out
+        self.done = 0
+        self.pruned = 0
+        self.started = time.monotonic()
+        self._drawn = 0.0
+        self._width = 0
+
+    def line(self, best: ty.Any = None) -> str:
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        line = f"{self.done}/{self.total} {self.what}, {rate:.0f}/s"
+        if rate and self.done < self.total:
+            line += f", ETA {(self.total - self.done) / rate:.0f}s"
+        if self.pruned:
+            line += f", {self.pruned / self.done:.0%} pruned"
+        if best is not None:
+            line += f", best so far: {self.describe(best)}"
+        return line
+
+    def update(self, done: int, best: ty.Any = None, pruned: int = 0) -> None:
+        self.done += done
+        self.pruned += pruned
+        now = time.monotonic()
+        if now - self._drawn >= self.every:
+            self._drawn = now
+            self._draw(self.line(best), end="")
+
+    def close(self, best: ty.Any = None, interrupted: bool = False) -> None:
+        line = self.line(best)
+        if interrupted:
+            line += " - stopped early"
+        elif self.done < self.total:
+            line += " - out of time"
+        self._draw(line)
+
+    def _draw(self, line: str, end: str = "\n") -> None:
+        # padded to cover whatever is left of a longer line drawn before it
+        print("\r" + line.ljust(self._width), end=end, file=self.out, flush=True)
+        self._width = len(line)
+
+
+def collect(
+    results: ty.Iterator[ty.Tuple[int, ty.Iterable[T], int]],
+    top: TopK[T],
+    progress: ty.Optional[Progress] = None,
+) -> TopK[T]:
+    """Pushes each batch of results into `top` as it arrives, where
+    `results` yields (number of inputs done, results for them, number
+    of those pruned without a result).
+
+    Ctrl-C stops the run - and the pool, which is started afresh next
+    time it is needed - leaving the best results so far in `top`.
+    """
+    interrupted = False
+    try:
+        for done, batch, pruned in results:
+            for item in batch:
+                top.push(item)
+            if progress:
+                progress.update(done, top.best(), pruned)
+    except KeyboardInterrupt:
+        interrupted = True
+        parallel.shutdown()
+    finally:
+        if progress:
+            progress.close(top.best(), interrupted)
+    return top
@@ -1,7 +1,23 @@
-from collections import defaultdict
-from typing import Callable, Collection, Dict, List, Tuple
-
-from .words import five_letter_word_list
+import operator
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import (
+    Callable,
+    Collection,
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+    cast,
+)
+
+from . import words
+from .alphabet import Alphabet
+from .patterns import encode_words
 
 PositionScores = Dict[int, Dict[str, float]]
 
@@ -15,31 +31,138 @@ def _xf_dict_vals(xf, d):
 
 
 def construct_position_freqs(word_list: Collection[str], decimal_points=5) -> PositionScores:
-    counts: dict[int, dict[str, float]] = defaultdict(lambda: defaultdict(int))
-    for word in word_list:
-        for i, char in enumerate(word):
-            counts[i][char] += 1
+    # counted a position at a time; first appearances are kept in order,
+    # so that ties sort the same as counting word by word did.
+    words = tuple(word_list)
+    counts = {
+        i: Counter(word[i] for word in words if len(word) > i)
+        for i in range(max(map(len, words), default=0))
+    }
+
+    return _freqs(counts, len(word_list), decimal_points)
 
+
+def _freqs(counts: Mapping[int, Mapping[str, int]], n_words: int, decimal_points: int) -> PositionScores:
     def count_to_freq(count: int) -> float:
-        return round(count / len(word_list), decimal_points)
+        return round(count / n_words, decimal_points)
 
     return {k: _xf_dict_vals(count_to_freq, _sort_dict_by_values(v)) for k, v in counts.items()}
 
 
-position_scores: PositionScores = construct_position_freqs(five_letter_word_list)
+class _Encoded(NamedTuple):
+    columns: Tuple[bytes, ...]  # the character code at each position, one byte per word
+    # the words with a character more than once, and where each character is
+    repeats: Tuple[Tuple[int, Tuple[Tuple[int, ...], ...]], ...]
+    alphabet: Alphabet
+
+
+def _encode(words: Tuple[str, ...]) -> Optional[_Encoded]:
+    """The words as byte columns - or None if they can't be, i.e. aren't
+    all the same length or have more symbols than fit in a byte, and must
+    be scored a word at a time.
+    """
+    encoded = encode_words(words)
+    if not encoded.columns:
+        return None
+    repeats = tuple(
+        (k, tuple(tuple(i for i, word_c in enumerate(word) if word_c == c) for c in dict.fromkeys(word)))
+        for k, word in enumerate(words)
+        if len(set(word)) < len(word)
+    )
+    return _Encoded(encoded.columns, repeats, encoded.alphabet)
+
+
+_encode_remembered = lru_cache(maxsize=8)(_encode)
+_REMEMBER_LISTS_OF = 1000
+
+
+def _encoded(words: Tuple[str, ...]) -> Optional[_Encoded]:
+    # long lists tend to be the same few lists (e.g. every word), scored
+    # over and over, so they are encoded only once.
+    return _encode_remembered(words) if len(words) >= _REMEMBER_LISTS_OF else _encode(words)
+
+
+def _rows(position_scores: PositionScores, encoded: _Encoded) -> List[List[float]]:
+    """The scores as a position × character-code table, stopping at the
+    first position without scores, as the per-word scorers do.
+    """
+    codes = encoded.alphabet.codes
+    rows = list()
+    for i in range(len(encoded.columns)):
+        if i not in position_scores:
+            break
+        row = [0.0] * 256
+        for c, score in position_scores[i].items():
+            if c in codes:
+                row[codes[c]] = score
+        rows.append(row)
+    return rows
+
+
+def _column_scores(rows: List[List[float]], encoded: _Encoded) -> List[List[float]]:
+    return [list(map(row.__getitem__, column)) for row, column in zip(rows, encoded.columns)]
+
+
+@lru_cache(maxsize=1)
+def _position_scores() -> PositionScores:
+    """construct_position_freqs(five_letter_word_list), from the compiled
+    list's counts rather than its words.
+    """
+    counts = words.position_counts("five_letter_word_list")
+    return _freqs(counts, sum(counts[0].values()) if counts else 0, 5)
+
+
+def __getattr__(name: str) -> PositionScores:
+    # position_scores is only worked out when first used
+    if name == "position_scores":
+        return _position_scores()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 Scorer = Callable[..., float]
 
 
-def score_words(position_scores: dict = position_scores) -> Scorer:
+class BatchScorer(Protocol):
+    """A scorer that can also score many candidates, each after the same
+    prefix words, at once - giving exactly what it would one at a time.
+    """
+
+    def __call__(self, *words: str) -> float:
+        ...
+
+    def score_batch(self, prefix_words: Sequence[str], candidates: Sequence[str]) -> Sequence[float]:
+        ...
+
+
+def batched(
+    scorer: Scorer, score_batch: Callable[[Sequence[str], Sequence[str]], Sequence[float]]
+) -> BatchScorer:
+    scorer.score_batch = score_batch  # type: ignore[attr-defined]
+    return cast(BatchScorer, scorer)
+
+
+def score_batch(
+    scorer: Scorer, prefix_words: Sequence[str], candidates: Sequence[str]
+) -> Sequence[float]:
+    """scorer(*prefix_words, candidate) for each candidate - all at once,
+    if the scorer can.
+    """
+    batch = getattr(scorer, "score_batch", None)
+    if batch is not None:
+        return batch(prefix_words, candidates)
+    return [scorer(*prefix_words, w) for w in candidates]
+
+
+def score_words(position_scores: Optional[dict] = None) -> BatchScorer:
     """Scores words based on total positional score across the word list."""
+    if position_scores is None:
+        position_scores = _position_scores()
 
-    def _score_words(*words: str) -> float:
+    def _word_scores(*words: str) -> List[float]:
         scored_in_position: dict[int, dict[str, bool]] = defaultdict(lambda: defaultdict(lambda: False))
 
         def score_word(w: str) -> float:
-            word_score = 0
+            word_score = 0.0
             for i, c in enumerate(w):
                 if i not in position_scores:
                     break
@@ -56,19 +179,43 @@ def score_words(position_scores: dict = position_scores) -> Scorer:
                 word_score += pos_score
             return word_score
 
-        return round(sum(score_word(w) for w in words), 3)
-
-    return _score_words
+        return [score_word(w) for w in words]
 
-
-def score_for_novelty(position_scores: dict = position_scores) -> Scorer:
+    def _score_words(*words: str) -> float:
+        return round(sum(_word_scores(*words)), 3)
+
+    def _score_batch(starting_words: Sequence[str], candidates: Sequence[str]) -> List[float]:
+        # the starting words are scored only once
+        encoded = _encoded(tuple(candidates))
+        if encoded is None:
+            return [_score_words(*starting_words, w) for w in candidates]
+        rows = _rows(position_scores, encoded)
+        codes = encoded.alphabet.codes
+        # what the starting words have already scored scores nothing again
+        for w in starting_words:
+            for row, c in zip(rows, w):
+                if c in codes:
+                    row[codes[c]] = 0.0
+        before = sum(_word_scores(*starting_words))
+        columns = _column_scores(rows, encoded)
+        totals: List[float] = [0.0] * len(candidates)
+        for column in columns:
+            totals = list(map(operator.add, totals, column))
+        return [round(before + total, 3) for total in totals]
+
+    return batched(_score_words, _score_batch)
+
+
+def score_for_novelty(position_scores: Optional[dict] = None) -> BatchScorer:
     """Scores words based on novelty of each character.
 
     In other words, we want as many different characters as possible,
     with as high a score in each position as possible.
     """
+    if position_scores is None:
+        position_scores = _position_scores()
 
-    def _score_for_novelty(*words: str) -> float:
+    def _word_scores(*words: str) -> List[float]:
         characters_scored = set()
 
         def score_word(word: str) -> float:
@@ -84,22 +231,45 @@ def score_for_novelty(position_scores: dict = position_scores) -> Scorer:
                 wscore += pos_score
             return wscore
 
-        return round(sum(score_word(word) for word in words), 3)
+        return [score_word(word) for word in words]
 
-    return _score_for_novelty
+    def _score_for_novelty(*words: str) -> float:
+        return round(sum(_word_scores(*words)), 3)
+
+    def _score_batch(starting_words: Sequence[str], candidates: Sequence[str]) -> List[float]:
+        # the starting words are scored only once
+        encoded = _encoded(tuple(candidates))
+        if encoded is None:
+            return [_score_for_novelty(*starting_words, w) for w in candidates]
+        rows = _rows(position_scores, encoded)
+        codes = encoded.alphabet.codes
+        # characters the starting words already have score nothing again
+        for row in rows:
+            for c in set("".join(starting_words)):
+                if c in codes:
+                    row[codes[c]] = 0.0
+        before = sum(_word_scores(*starting_words))
+        # a word's score is its positions' scores, added up (as above) best
+        # first - but a repeated character only scores once, as much as it can.
+        columns = _column_scores(rows, encoded)
+        scores = [sum(sorted(word_scores, reverse=True)) for word_scores in zip(*columns)]
+        for k, positions in encoded.repeats:
+            scores[k] = sum(sorted((max(columns[i][k] for i in at) for at in positions), reverse=True))
+        return [round(before + score, 3) for score in scores]
+
+    return batched(_score_for_novelty, _score_batch)
 
 
 def best_next_score(
     word_list: Collection[str], *starting_words, scorer=score_words()
-) -> List[Tuple[int, str]]:
+) -> List[Tuple[float, str]]:
     """Determines a best next word score without regard to solving.
 
     Mostly useful for playing around with different combinations of
     two and three word starts, to find something you actually like.
     """
-    best_words = list()
-    for w_next in word_list:
-        best_words.append((scorer(*starting_words, w_next), w_next))
+    words = tuple(word_list)
+    best_words = list(zip(score_batch(scorer, starting_words, words), words))
 
     try:
         print(scorer.hit_rate)
@@ -2,9 +2,9 @@ import typing as ty
 from collections import defaultdict
 from itertools import combinations
 
+from . import words as word_lists
 from .constrain import ALPHA
 from .game import WordElim, best_elim, hashable, new_game
-from .words import sols
 
 _COMBS = dict()
 
@@ -74,7 +74,7 @@ def shark_scarf_paths(pattern: str, shark_scarf: ty.Collection[str]) -> ty.Itera
         return g
 
     for w in shark_scarf:
-        game = new_game(ALPHA, sols)
+        game = new_game(ALPHA, word_lists.sols)
         g = w_to_g(w)
         game.guesses.append(g)
         yield Path(w, g, best_elim(hashable(game), game.wl)[-1])
@@ -128,7 +128,7 @@ def best_worst_avg(paths: ty.Sequence[Path]) -> PathStats:
 def do_it():
     import traceback
 
-    for size, threes in reversed(counted(find_threes(*sols)).items()):
+    for size, threes in reversed(counted(find_threes(*word_lists.sols)).items()):
         for pat, words in threes.items():
             try:
                 res = best_worst_avg(list(shark_scarf_paths(pat, words)))
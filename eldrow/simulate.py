@@ -0,0 +1,146 @@
+"""Playing every solution (or a sample of them) to the end with a given
+strategy, to measure how well and how quickly it solves.
+
+A strategy is any function from a game to the next guess; the ones
+here are named in STRATEGIES, and a name is what gets sent to the pool.
+Games are played in parallel, in chunks of solutions that the opener
+leaves in the same state, since they share the early part of their game
+trees; each process decides any given state only once, and only those
+decisions are timed.
+"""
+import statistics
+import time
+import typing as ty
+from collections import Counter
+
+from . import parallel, words
+from .game import HashableGame, _simple_words, best_elim, best_novelty, best_options, get_options
+from .multi import _best_sampled_words_across_games
+from .patterns import answers, pattern, pattern_to_guess, solved
+
+Strategy = ty.Callable[[HashableGame], str]
+
+MAX_GUESSES = 6  # solving in more than this is a failure
+_GIVE_UP = 20  # ...and a strategy that hasn't solved it by now never will
+_ELIM_CANDIDATES = 250
+
+
+def _elim(game: HashableGame) -> str:
+    candidates = _best_sampled_words_across_games([game], _ELIM_CANDIDATES, words.five_letter_word_list)
+    return best_elim(game, candidates, workers=1, limit=1)[-1].scored_word
+
+
+def _options(game: HashableGame) -> str:
+    return best_options(game)[-1][1]
+
+
+def _novelty(game: HashableGame) -> str:
+    # once nothing new is left to learn, the most novel word is arbitrary
+    guessed = set(_simple_words(*game.guesses))
+    score, word = [(score, word) for score, word in best_novelty(game) if word not in guessed][-1]
+    return word if score > 0 else _options(game)
+
+
+STRATEGIES: ty.Dict[str, Strategy] = dict(elim=_elim, options=_options, novelty=_novelty)
+
+
+class GameResult(ty.NamedTuple):
+    solution: str
+    guesses: ty.Tuple[str, ...]
+    solved: bool
+    decision_seconds: ty.Tuple[float, ...]  # for each guess actually worked out, rather than remembered
+
+
+_DECIDED: ty.Dict[ty.Tuple[str, HashableGame], str] = dict()
+
+
+def _decide(strategy: str, game: HashableGame) -> ty.Tuple[str, ty.Optional[float]]:
+    key = (strategy, game)
+    if key in _DECIDED:
+        return _DECIDED[key], None
+    started = time.perf_counter()
+    opts = get_options(game)
+    # with only one option left, every strategy should take it
+    guess = opts[0] if len(opts) == 1 else STRATEGIES[strategy](game)
+    _DECIDED[key] = guess
+    return guess, time.perf_counter() - started
+
+
+def play(
+    strategy: str, solution: str, start: HashableGame, opener: ty.Optional[str] = None
+) -> GameResult:
+    game = start
+    guesses: ty.List[str] = list()
+    seconds: ty.List[float] = list()
+    while len(guesses) < _GIVE_UP:
+        if opener and not guesses:
+            guess = opener
+        else:
+            guess, secs = _decide(strategy, game)
+            if secs is not None:
+                seconds.append(secs)
+        guesses.append(guess)
+        code = pattern(solution, guess)
+        if code == solved(len(guess)):
+            return GameResult(solution, tuple(guesses), True, tuple(seconds))
+        game = game._replace(guesses=(*game.guesses, pattern_to_guess(guess, code)))
+    return GameResult(solution, tuple(guesses), False, tuple(seconds))
+
+
+def _play_all(
+    strategy: str, solutions: ty.Tuple[str, ...], start: HashableGame, opener: ty.Optional[str]
+) -> ty.List[GameResult]:
+    return [play(strategy, solution, start, opener) for solution in solutions]
+
+
+def simulate(
+    strategy: str,
+    solutions: ty.Optional[ty.Sequence[str]] = None,
+    opener: ty.Optional[str] = "slate",
+    start: ty.Optional[HashableGame] = None,
+    workers: ty.Optional[int] = None,
+) -> ty.List[GameResult]:
+    """Every solution played to the end, in the order given."""
+    assert strategy in STRATEGIES, f"Unknown strategy {strategy}; try one of {sorted(STRATEGIES)}"
+    solutions = solutions if solutions is not None else words.sols
+    start = start or HashableGame(5, words.sols, frozenset(words.alphabet().symbols), tuple(), tuple())
+    # solutions the opener can't tell apart go to the same process
+    if opener:
+        by_state = sorted(solutions, key=dict(zip(solutions, answers(opener, solutions))).__getitem__)
+    else:
+        by_state = list(solutions)
+    chunks = parallel.chunked(by_state, (workers or parallel.workers()) * 4)
+    results: ty.Dict[str, GameResult] = dict()
+    for _task, chunk_results in parallel.imap(
+        _play_all, [(strategy, chunk, start, opener) for chunk in chunks], workers=workers
+    ):
+        results.update((result.solution, result) for result in chunk_results)
+    return [results[solution] for solution in solutions]
+
+
+def _percentile(values: ty.Sequence[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else 0.0
+
+
+def report(results: ty.Sequence[GameResult], wall_seconds: float) -> ty.Dict[str, ty.Any]:
+    """Everything worth comparing between two runs, as plain JSON-able data."""
+    n_guesses = [len(result.guesses) for result in results if result.solved]
+    failures = [r.solution for r in results if not r.solved or len(r.guesses) > MAX_GUESSES]
+    seconds = [secs for result in results for secs in result.decision_seconds]
+    return dict(
+        games=len(results),
+        mean_guesses=statistics.mean(n_guesses) if n_guesses else None,
+        distribution={str(k): v for k, v in sorted(Counter(n_guesses).items())},
+        unsolved=sum(not result.solved for result in results),
+        failure_rate=len(failures) / len(results) if results else 0.0,
+        failures=failures,
+        decisions=len(seconds),
+        seconds_per_decision=dict(
+            mean=statistics.mean(seconds) if seconds else 0.0,
+            p50=_percentile(seconds, 0.5),
+            p95=_percentile(seconds, 0.95),
+            max=max(seconds, default=0.0),
+        ),
+        wall_seconds=wall_seconds,
+    )
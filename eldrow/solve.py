@@ -0,0 +1,229 @@
+"""Looking ahead more than one guess: a decision tree that solves a game
+in as few guesses as possible - on average, or in the worst case.
+
+Every guess splits the options into buckets by the pattern it gets back,
+and each bucket is solved the same way, so the search is over option
+sets rather than games. The same option set is reached by many guesses,
+so each is solved once per search. A guess is abandoned as soon as the
+buckets it has solved so far, plus a lower bound for the rest, can't
+beat the best guess so far.
+
+Only the most promising guesses at each step are searched (`width`, by
+the sampled elimination estimate). Past the depth or time budget only
+the most promising of the options is, without ranking every word, which
+finishes the tree quickly but greedily.
+"""
+import json
+import time
+import typing as ty
+from collections import defaultdict
+
+from . import words
+from .elimination import equivalence_classes, sampled_elimination_estimator
+from .game import HashableGame, get_options
+from .patterns import EncodedWords, answers, encode_words, pattern_to_guess, solved
+
+Objective = ty.Literal["expected", "worst"]
+
+_CHECK_TIME_EVERY = 256  # words estimated between looks at the clock
+
+
+class Node(ty.NamedTuple):
+    guess: str
+    options: int  # how many words could be the solution here
+    expected: float  # guesses to solve from here, counting this one, on average
+    worst: int  # ...and at most
+    # the next step, by the pattern this guess gets back (e.g. "c(R)anE");
+    # none for the pattern that solves it.
+    children: ty.Dict[str, "Node"]
+
+    def to_json(self) -> dict:
+        return dict(
+            guess=self.guess,
+            options=self.options,
+            expected=self.expected,
+            worst=self.worst,
+            children={pattern: child.to_json() for pattern, child in self.children.items()},
+        )
+
+    @staticmethod
+    def from_json(d: dict) -> "Node":
+        return Node(
+            d["guess"],
+            d["options"],
+            d["expected"],
+            d["worst"],
+            {pattern: Node.from_json(child) for pattern, child in d["children"].items()},
+        )
+
+    def size(self) -> int:
+        return 1 + sum(child.size() for child in self.children.values())
+
+
+def save(node: Node, path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(node.to_json(), f)
+
+
+def load(path: str) -> Node:
+    with open(path) as f:
+        return Node.from_json(json.load(f))
+
+
+def _node(guess: str, options: int, children: ty.Dict[str, Node]) -> Node:
+    expected = 1 + sum(child.options * child.expected for child in children.values()) / options
+    worst = 1 + max((child.worst for child in children.values()), default=0)
+    return Node(guess, options, expected, worst, children)
+
+
+def _value(node: Node, objective: Objective) -> float:
+    return node.expected if objective == "expected" else node.worst
+
+
+def _lower_bound(n: int, objective: Objective) -> float:
+    # at best, the first guess is the solution, and it tells every
+    # other option apart so that one more guess solves any of them.
+    if n == 1:
+        return 1.0
+    return 2 - 1 / n if objective == "expected" else 2.0
+
+
+class Solver:
+    def __init__(
+        self,
+        objective: Objective = "expected",
+        width: int = 8,
+        max_depth: ty.Optional[int] = None,
+        budget: ty.Optional[float] = None,
+        guesses: ty.Optional[ty.Sequence[str]] = None,
+    ):
+        self.objective = objective
+        self.width = width
+        self.max_depth = max_depth
+        self.deadline = time.monotonic() + budget if budget is not None else None
+        self.guesses = tuple(guesses if guesses is not None else words.five_letter_word_list)
+        self._solved: ty.Dict[ty.Tuple[str, ...], Node] = dict()
+        self.searched = 0  # option sets, i.e. nodes, actually searched
+
+    def _buckets(self, guess: str, options: EncodedWords) -> ty.Dict[int, ty.List[str]]:
+        buckets: ty.Dict[int, ty.List[str]] = defaultdict(list)
+        for word, code in zip(options.words, answers(guess, options)):
+            buckets[code].append(word)
+        return buckets
+
+    def _out_of_time(self) -> bool:
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def _candidates(self, options: ty.Tuple[str, ...], width: int) -> ty.List[str]:
+        """The most promising guesses, best first: the options always, and
+        whichever other words are estimated to eliminate more - as many of
+        them as can be estimated before the deadline.
+        """
+        estimate = sampled_elimination_estimator(options)
+        scores = {option: estimate(option) for option in options}
+        best_option = max(options, key=scores.__getitem__)
+        if width <= 1:
+            return [best_option]
+        words = self.guesses
+        for k, members in enumerate(equivalence_classes(words, options)):
+            if k % _CHECK_TIME_EVERY == 0 and self._out_of_time():
+                break
+            word = words[members[0]]
+            if word not in scores:
+                scores[word] = estimate(word)
+        ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+        return list(dict.fromkeys([*ranked[:width], best_option]))
+
+    def solve(self, options: ty.Tuple[str, ...], depth: int = 0) -> Node:
+        if options in self._solved:
+            return self._solved[options]
+        node = self._search(options, depth)
+        self._solved[options] = node
+        return node
+
+    def _search(self, options: ty.Tuple[str, ...], depth: int) -> Node:
+        n = len(options)
+        if n == 1:
+            return Node(options[0], 1, 1.0, 1, dict())
+        self.searched += 1
+        out_of_budget = (self.max_depth is not None and depth >= self.max_depth) or self._out_of_time()
+        lower_bound = _lower_bound(n, self.objective)
+
+        # an option that tells all the others apart can't be beaten.
+        encoded = encode_words(options)
+        for option in options:
+            if len(set(answers(option, encoded))) == n:
+                return self._expand(option, options, self._buckets(option, encoded), depth)
+
+        best: ty.Optional[Node] = None
+        for guess in self._candidates(options, 1 if out_of_budget else self.width):
+            if best is not None and self._out_of_time():
+                break  # the best tree so far will have to do
+            node = self._evaluate(guess, encoded, depth, best)
+            if node is not None and (
+                best is None or _value(node, self.objective) < _value(best, self.objective)
+            ):
+                best = node
+                if _value(best, self.objective) <= lower_bound:
+                    break
+        assert best is not None, options
+        return best
+
+    def _expand(
+        self, guess: str, options: ty.Tuple[str, ...], buckets: ty.Dict[int, ty.List[str]], depth: int
+    ) -> Node:
+        solved_code = solved(len(guess))
+        children = {
+            pattern_to_guess(guess, code): self.solve(tuple(bucket), depth + 1)
+            for code, bucket in buckets.items()
+            if code != solved_code
+        }
+        return _node(guess, len(options), children)
+
+    def _evaluate(
+        self, guess: str, options: EncodedWords, depth: int, best: ty.Optional[Node]
+    ) -> ty.Optional[Node]:
+        """The tree below this guess, or None if it can't beat the best so far."""
+        n = len(options.words)
+        solved_code = solved(len(guess))
+        buckets = self._buckets(guess, options)
+        if len(buckets) == 1 and solved_code not in buckets:
+            return None  # learns nothing
+        # the biggest buckets first, as they decide the most
+        remaining = sorted(
+            ((code, bucket) for code, bucket in buckets.items() if code != solved_code),
+            key=lambda cb: len(cb[1]),
+            reverse=True,
+        )
+        bounds = [_lower_bound(len(bucket), self.objective) for _code, bucket in remaining]
+        children: ty.Dict[str, Node] = dict()
+        for i, (code, bucket) in enumerate(remaining):
+            if best is not None:
+                if self.objective == "expected":
+                    done = sum(child.options * child.expected for child in children.values())
+                    at_least = (
+                        1
+                        + (done + sum(len(b) * lb for (_c, b), lb in zip(remaining[i:], bounds[i:]))) / n
+                    )
+                else:
+                    at_least = 1 + max([*(child.worst for child in children.values()), *bounds[i:]])
+                if at_least >= _value(best, self.objective):
+                    return None
+            children[pattern_to_guess(guess, code)] = self.solve(tuple(bucket), depth + 1)
+        return _node(guess, n, children)
+
+
+def solve(
+    game: HashableGame,
+    objective: Objective = "expected",
+    width: int = 8,
+    max_depth: ty.Optional[int] = None,
+    budget: ty.Optional[float] = None,
+    guesses: ty.Optional[ty.Sequence[str]] = None,
+) -> Node:
+    """A decision tree from this point in the game, whose first guess is
+    the one to make now. `budget` is in seconds.
+    """
+    options = get_options(game)
+    assert options, "There is nothing left to solve"
+    return Solver(objective, width, max_depth, budget, guesses).solve(tuple(sorted(options)))
@@ -0,0 +1,91 @@
+"""Bitset indexes over a word list, for resolving constraints to options.
+
+Bit i of every bitset stands for word i of the word list, so narrowing
+the options down is a handful of ORs and ANDs on Python ints rather than
+a scan of every word.
+"""
+import typing as ty
+from collections import Counter, defaultdict
+from functools import cache
+
+from . import words
+from .constrain import Constraint
+
+
+def _bitset(indexes: ty.Iterable[int], n: int) -> int:
+    bits = bytearray((n + 7) // 8)
+    for i in indexes:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, "little")
+
+
+class WordIndex:
+    def __init__(self, words: ty.Sequence[str]):
+        self.words = tuple(words)
+        self.all = (1 << len(self.words)) - 1
+
+        at: dict[ty.Tuple[int, str], ty.List[int]] = defaultdict(list)
+        at_least: dict[ty.Tuple[str, int], ty.List[int]] = defaultdict(list)
+        for i, word in enumerate(self.words):
+            for pos, c in enumerate(word):
+                at[(pos, c)].append(i)
+            for c, count in Counter(word).items():
+                for min_count in range(1, count + 1):
+                    at_least[(c, min_count)].append(i)
+
+        n = len(self.words)
+        self._at = {key: _bitset(indexes, n) for key, indexes in at.items()}
+        self._at_least = {key: _bitset(indexes, n) for key, indexes in at_least.items()}
+
+    def at(self, pos: int, chars: ty.Iterable[str]) -> int:
+        """Words having any of the characters at the position."""
+        bits = 0
+        for c in chars:
+            bits |= self._at.get((pos, c), 0)
+        return bits
+
+    def at_least(self, c: str, count: int) -> int:
+        """Words containing the character at least `count` times."""
+        if count <= 0:
+            return self.all
+        return self._at_least.get((c, count), 0)
+
+    def matching(self, constraint: Constraint) -> int:
+        bits = self.all
+        for pos, eliminated in enumerate(constraint.eliminated):
+            if eliminated:
+                bits &= self.at(pos, constraint.chars(constraint.allowed(pos)))
+        for c, count in zip(constraint.alphabet, constraint.min_counts):
+            if count:
+                bits &= self.at_least(c, count)
+        for c, count in constraint.limits().items():
+            bits &= self.all ^ self.at_least(c, count + 1)
+        return bits
+
+    def select(self, bits: int) -> ty.List[str]:
+        """The words whose bits are set, in word list order."""
+        words = self.words
+        # bin() is by far the quickest way to get at the individual bits
+        # of a large int; reversed so that string index == word index.
+        binary = bin(bits)[:1:-1]
+        selected = list()
+        i = binary.find("1")
+        while i != -1:
+            selected.append(words[i])
+            i = binary.find("1", i + 1)
+        return selected
+
+
+def word_index(wl: ty.Optional[ty.Tuple[str, ...]] = None) -> WordIndex:
+    return _word_index(wl if wl is not None else words.five_letter_word_list)
+
+
+@cache
+def _word_index(wl: ty.Tuple[str, ...]) -> WordIndex:
+    return WordIndex(wl)
+
+
+def options(constraint: Constraint, wl: ty.Optional[ty.Tuple[str, ...]] = None) -> ty.List[str]:
+    """The words in the list that satisfy a constraint as returned by `given`."""
+    index = word_index(wl)
+    return index.select(index.matching(constraint))
@@ -1,11 +1,259 @@
-with open("5_letter_words.txt") as f:
-    five_letter_word_list = tuple(f.read().splitlines())
+"""The word lists, read from the data directory (ELDROW_DATA_DIR, or else
+the checkout this package is in) only when first used: importing this
+module, or any other, reads nothing.
 
-with open("sols.txt") as f:
-    sols = tuple(f.read().splitlines())
+The lists are those of ELDROW_LANGUAGE - English unless it says
+otherwise - folded, where the language's game treats some characters
+as the same letter, to the letters it actually tells apart.
 
-with open("other.txt") as f:
-    sols = tuple(sorted(set(sols) | set(f.read().splitlines())))
+Each list is compiled, the first time it is read, into a binary file in
+`compiled/` under the data directory - every word as fixed-width one
+byte codes (see alphabet), an index of the words in sorted order, and
+how many words have each code at each position - which later sessions
+memory-map rather than parse, and which answers membership and letter
+counts without decoding a single word. A compiled list is rebuilt
+whenever a text file it came from changes, and lists that can't be
+compiled (words of different lengths, or more symbols than fit in a
+byte) are only ever read as text.
+"""
+import json
+import os
+import struct
+import sys
+import typing as ty
+from mmap import ACCESS_READ, mmap
 
-with open("dumb_words.txt") as f:
-    dumb_words = tuple(f.read().splitlines())
+from .alphabet import MAX_SYMBOLS, Alphabet, alphabet_of, fold_accents
+
+DATA_DIR = os.getenv("ELDROW_DATA_DIR") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LANGUAGE = os.getenv("ELDROW_LANGUAGE", "english")
+
+# each language's lists, and the text files each is made of: one file is
+# taken in order, several are merged and sorted.
+_LANGUAGES: ty.Dict[str, ty.Dict[str, ty.Tuple[str, ...]]] = dict(
+    english=dict(
+        five_letter_word_list=("5_letter_words.txt",),
+        sols=("sols.txt", "other.txt"),
+        dumb_words=("dumb_words.txt",),
+    ),
+    # Termo's solutions aren't among its other words
+    termo=dict(
+        five_letter_word_list=("termo/sols.txt", "termo/words.txt"),
+        sols=("termo/sols.txt",),
+        dumb_words=(),
+    ),
+)
+# for the languages whose games treat some characters as the same letter,
+# how to fold them together
+_FOLDS: ty.Dict[str, ty.Callable[[str], str]] = dict(termo=fold_accents)
+
+_MAGIC = b"ELDW"
+_VERSION = 2
+
+
+def fold(text: str, language: str = LANGUAGE) -> str:
+    """The text as the language's game sees it."""
+    return _FOLDS[language](text) if language in _FOLDS else text
+
+
+def _read_text(name: str, language: str = LANGUAGE) -> ty.Tuple[str, ...]:
+    lists = list()
+    for source in _LANGUAGES[language][name]:
+        with open(os.path.join(DATA_DIR, source)) as f:
+            lists.append(f.read().splitlines())
+    if language in _FOLDS:
+        # e.g. 'sábia', 'sabiá' and 'sabia' are all the one word 'sabia'
+        lists = [list(dict.fromkeys(fold(word, language) for word in words)) for words in lists]
+    if len(lists) == 1:
+        return tuple(lists[0])
+    return tuple(sorted(set().union(*lists)))
+
+
+def _stamp(name: str) -> ty.List[ty.List]:
+    stamp = list()
+    for source in _LANGUAGES[LANGUAGE][name]:
+        stat = os.stat(os.path.join(DATA_DIR, source))
+        stamp.append([source, stat.st_size, stat.st_mtime_ns])
+    return stamp
+
+
+def _compiled_path(name: str) -> str:
+    return os.path.join(DATA_DIR, "compiled", LANGUAGE, name + ".eldw")
+
+
+class Compiled:
+    """A compiled word list, memory-mapped.
+
+    The file is a header (magic, header length, then JSON, which includes
+    the alphabet and each position's characters in order of first
+    appearance) followed by the words' codes (count × length bytes), the
+    sorted index (count little-endian uint32s) and each position's counts
+    by code (length × 256 uint32s).
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mapped = mmap(f.fileno(), 0, access=ACCESS_READ)
+        if self._mapped[:4] != _MAGIC:
+            raise ValueError(f"{path} is not a compiled word list")
+        (header_size,) = struct.unpack_from("<I", self._mapped, 4)
+        self.header = json.loads(self._mapped[8 : 8 + header_size])
+        self.length: int = self.header["length"]
+        self.count: int = self.header["count"]
+        self.alphabet = Alphabet(self.header["alphabet"])
+        self._codes = 8 + header_size
+        self._index = self._codes + self.count * self.length
+        self._counts = self._index + 4 * self.count
+
+    def words(self) -> ty.Tuple[str, ...]:
+        data = self.alphabet.decode(self._mapped[self._codes : self._index])
+        n = self.length
+        return tuple(data[i : i + n] for i in range(0, len(data), n))
+
+    def _word(self, k: int) -> bytes:
+        start = self._codes + k * self.length
+        return self._mapped[start : start + self.length]
+
+    def __contains__(self, word: str) -> bool:
+        if len(word) != self.length or not self.alphabet.spells(word):
+            return False
+        encoded = self.alphabet.encode(word)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            (k,) = struct.unpack_from("<I", self._mapped, self._index + 4 * mid)
+            if self._word(k) < encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.count:
+            return False
+        (k,) = struct.unpack_from("<I", self._mapped, self._index + 4 * lo)
+        return self._word(k) == encoded
+
+    def position_counts(self) -> ty.Dict[int, ty.Dict[str, int]]:
+        """How many words have each character at each position, with the
+        characters in the order they first appear there.
+        """
+        codes = self.alphabet.codes
+        counts = dict()
+        for i, first in enumerate(self.header["first"]):
+            by_code = struct.unpack_from("<256I", self._mapped, self._counts + 4 * 256 * i)
+            counts[i] = {c: by_code[codes[c]] for c in first}
+        return counts
+
+
+def compile_words(words: ty.Sequence[str], path: str, header: ty.Dict[str, ty.Any]) -> bool:
+    """Writes the words as a compiled list, if they can be."""
+    lengths = set(map(len, words))
+    alphabet = alphabet_of(words)
+    if len(lengths) != 1 or len(alphabet.symbols) > MAX_SYMBOLS:
+        return False
+    (length,) = lengths
+    encoded = [alphabet.encode(word) for word in words]
+
+    counts = [[0] * 256 for _ in range(length)]
+    first: ty.List[ty.Dict[str, None]] = [dict() for _ in range(length)]
+    for word in words:
+        for i, c in enumerate(word):
+            first[i].setdefault(c)
+    for word_codes in encoded:
+        for i, code in enumerate(word_codes):
+            counts[i][code] += 1
+    order = sorted(range(len(encoded)), key=encoded.__getitem__)
+
+    header = dict(
+        header,
+        version=_VERSION,
+        length=length,
+        count=len(words),
+        alphabet=alphabet.symbols,
+        first=["".join(chars) for chars in first],
+    )
+    header_bytes = json.dumps(header).encode()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + f".{os.getpid()}"
+    with open(partial, "wb") as f:
+        f.write(_MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        f.write(b"".join(encoded))
+        f.write(struct.pack(f"<{len(order)}I", *order))
+        for by_code in counts:
+            f.write(struct.pack("<256I", *by_code))
+    # so that another process never maps a half-written list
+    os.replace(partial, path)
+    return True
+
+
+_COMPILED: ty.Dict[str, ty.Optional[Compiled]] = dict()
+
+
+def compiled(name: str) -> ty.Optional[Compiled]:
+    """The list compiled from its current text files, compiling it if
+    need be - or None if it can't be.
+    """
+    if name not in _COMPILED:
+        _COMPILED[name] = _compiled(name)
+    return _COMPILED[name]
+
+
+def _compiled(name: str) -> ty.Optional[Compiled]:
+    path = _compiled_path(name)
+    stamp = _stamp(name)
+    try:
+        existing = Compiled(path)
+        if existing.header.get("version") == _VERSION and existing.header.get("sources") == stamp:
+            return existing
+    except (OSError, ValueError):
+        pass
+    try:
+        if compile_words(_read_text(name), path, dict(sources=stamp)):
+            return Compiled(path)
+    except OSError:
+        pass  # e.g. a read-only data directory
+    return None
+
+
+def _load(name: str) -> ty.Tuple[str, ...]:
+    words = compiled(name)
+    return words.words() if words is not None else _read_text(name)
+
+
+def alphabet(name: str = "five_letter_word_list") -> Alphabet:
+    """Every symbol the list uses."""
+    words = compiled(name)
+    return words.alphabet if words is not None else alphabet_of(getattr(sys.modules[__name__], name))
+
+
+def is_word(word: str, name: str = "five_letter_word_list") -> bool:
+    word = fold(word)
+    words = compiled(name)
+    return word in words if words is not None else word in getattr(sys.modules[__name__], name)
+
+
+def position_counts(name: str) -> ty.Dict[int, ty.Dict[str, int]]:
+    """How many words in the list have each character at each position,
+    in the order each first appears there.
+    """
+    words = compiled(name)
+    if words is not None:
+        return words.position_counts()
+    counts: ty.Dict[int, ty.Dict[str, int]] = dict()
+    for word in getattr(sys.modules[__name__], name):
+        for i, c in enumerate(word):
+            counts.setdefault(i, dict())
+            counts[i][c] = counts[i].get(c, 0) + 1
+    return counts
+
+
+five_letter_word_list: ty.Tuple[str, ...]
+sols: ty.Tuple[str, ...]
+dumb_words: ty.Tuple[str, ...]
+
+
+def __getattr__(name: str) -> ty.Tuple[str, ...]:
+    if name not in _LANGUAGES[LANGUAGE]:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    words = _load(name)
+    # from now on found without coming back here, and always the same tuple
+    globals()[name] = words
+    return words
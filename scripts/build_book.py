@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""Works out an opening book for an opener, for %best_elim to answer
+from instantly after it.
+
+    scripts/build_book.py --opener slate --depth 2
+
+Depth 1 covers every state the opener can leave the game in; each extra
+ply also covers every state the best guess for each of those can. Run
+it from where the IPython CLI runs, so that words killed there are left
+out of the options here too.
+"""
+import argparse
+import os
+import time
+
+from eldrow.book import BOOK_FILE, build, save
+from eldrow.constrain import ALPHA
+from eldrow.game import HashableGame
+from eldrow.memoize import elim_store
+from eldrow.words import sols
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--opener", default="slate")
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument(
+        "--k", type=int, default=30, help="how many of the best words to keep for each state"
+    )
+    parser.add_argument("--out", default=BOOK_FILE)
+    args = parser.parse_args()
+
+    killed: tuple = tuple()
+    if os.path.exists("killed.txt"):
+        with open("killed.txt") as f:
+            killed = tuple(sorted(set(f.read().splitlines())))
+
+    started = time.monotonic()
+    try:
+        book = build(
+            HashableGame(5, sols, ALPHA, tuple(), killed), args.opener, args.depth, args.k, True
+        )
+    finally:
+        elim_store.commit()
+    save(book, args.out)
+    print(f"{len(book.entries)} states in {time.monotonic() - started:.0f}s, written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
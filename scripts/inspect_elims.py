@@ -1,13 +1,40 @@
 #!/usr/bin/env python
+"""How often does scoring only the first N candidates of a cheap ranking
+still find the best words, and how much quicker is it?
+
+For a fixed (seeded) set of game states, the top k words by exact
+elimination score over every word are compared with the top k found by
+scoring only each ranker's first N words, for each N. Every timing
+starts from a cold elimination cache, and everything is scored in this
+process, so that the speedups compare work rather than caching or
+parallelism.
+
+    scripts/inspect_elims.py --states 20 --k 10 --json report.json
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
 import typing as ty
 from itertools import product
 
-from eldrow.colors import CGREEN, CORANGE, CRED, CYELLOW, c
-from eldrow.constrain import ALPHA
-from eldrow.formatting import _format_welim
-from eldrow.game import HashableGame, best_elim, get_options
-from eldrow.multi import _best_novelty_words_across_games
-from eldrow.words import five_letter_word_list, sols
+# a throwaway store, so that the benchmark neither reads nor fills (nor,
+# since it is emptied before every timing, clears) the real one.
+os.environ["ELDROW_ELIM_STORE"] = os.path.join(tempfile.mkdtemp(), "elims.sqlite")
+
+from eldrow.colors import CGREEN, CRED, CYELLOW, c  # noqa: E402
+from eldrow.constrain import ALPHA  # noqa: E402
+from eldrow.game import HashableGame, WordElim, best_elim, get_options  # noqa: E402
+from eldrow.memoize import elim_store  # noqa: E402
+from eldrow.multi import _best_novelty_words_across_games, _best_sampled_words_across_games  # noqa: E402
+from eldrow.words import five_letter_word_list, sols  # noqa: E402
+
+RANKERS: ty.Dict[str, ty.Callable[[HashableGame, int], ty.List[str]]] = dict(
+    novelty=lambda game, n: _best_novelty_words_across_games([game], n, five_letter_word_list),
+    sampled=lambda game, n: _best_sampled_words_across_games([game], n, five_letter_word_list),
+)
 
 
 def yield_guesses(word: str) -> ty.Iterator[tuple[str, ...]]:
@@ -23,52 +50,87 @@ def yield_guesses(word: str) -> ty.Iterator[tuple[str, ...]]:
         yield (w,)
 
 
-def foo(guesses_iter: ty.Iterable[tuple[str, ...]]):
-    def mk_game(*guesses: str) -> HashableGame:
-        return HashableGame(5, sols, ALPHA, guesses, tuple())
-
-    for guesses in guesses_iter:
-        print(guesses)
-        game = mk_game(*guesses)
-        opts = get_options(game)
-        if len(opts) < 3:
-            # nothing to be found
-            continue
-
-        true_best = None
-        for n in (16000, 8000, 6000, 4000, 2000, 1000, 500, 250, 125):
-            candidates = _best_novelty_words_across_games([game], n, five_letter_word_list)
-
-            best = list(reversed(best_elim(game, candidates)))
-
-            COMP = 10
-            if not true_best:
-                true_best = best
-                continue
-            for i in range(1, COMP):
-                if best[:i] != true_best[:i]:
-                    diff = best[i]
-                    tot_diff = true_best[0].elim_score - diff.elim_score
-                    pct_diff = (tot_diff / true_best[0].elim_score) * 100
-                    ps = f"difference of {tot_diff:.2f} or {pct_diff:.1f}%."
-                    pstr = c(CGREEN, ps)
-                    if pct_diff > 2:
-                        pstr = c(CYELLOW, ps)
-                    if pct_diff > 4:
-                        pstr = c(CORANGE, ps)
-                    if pct_diff > 8:
-                        pstr = c(CRED, ps)
-                    if pct_diff > 1:
-                        print(
-                            f"with {guesses} and {len(opts)}, using {n} words, took until top {i}"
-                            f" to find a {pstr}"
-                        )
-                        print(" ".join(_format_welim(true_best[i])))
-                    break
-            if best[0] != true_best[0]:
-                print(c(CRED, f"Best option different at {n}, {pstr}, n opts: {len(opts)}"))
-                break
+def states(opener: str, n_states: int, seed: int) -> ty.List[HashableGame]:
+    games = [HashableGame(5, sols, ALPHA, guesses, tuple()) for guesses in yield_guesses(opener)]
+    # fewer than 3 options leaves nothing to be found
+    games = [game for game in games if len(get_options(game)) >= 3]
+    return random.Random(seed).sample(games, min(n_states, len(games)))
+
+
+def cold(f: ty.Callable[[], ty.List[WordElim]]) -> ty.Tuple[ty.List[WordElim], float]:
+    elim_store.clear()
+    started = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - started
+
+
+def recall(found: ty.List[WordElim], best: ty.List[WordElim]) -> float:
+    """The share of the true top k that was matched by a word at least as
+    good - so that a tie for k-th place counts no matter which word won it.
+    """
+    kth = best[0].elim_score
+    return min(len(best), sum(1 for w in found if w.elim_score >= kth)) / len(best)
+
+
+def benchmark(
+    games: ty.List[HashableGame], limits: ty.List[int], k: int
+) -> ty.Dict[str, ty.Dict[int, ty.Dict[str, float]]]:
+    totals: ty.Dict[str, ty.Dict[int, ty.Dict[str, float]]] = {
+        name: {n: dict(recall=0.0, top1=0.0, seconds=0.0, full_seconds=0.0) for n in limits}
+        for name in RANKERS
+    }
+    for game in games:
+        # the first run fills the pattern matrix, which would otherwise favor later runs
+        best_elim(game, five_letter_word_list, workers=1, limit=k)
+        best, full_seconds = cold(lambda: best_elim(game, five_letter_word_list, workers=1, limit=k))
+        print(f"{' '.join(game.guesses)}: {len(get_options(game))} options, {full_seconds:.2f}s for all")
+        for (name, ranker), n in product(RANKERS.items(), limits):
+            found, seconds = cold(lambda: best_elim(game, ranker(game, n), workers=1, limit=k))
+            row = totals[name][n]
+            row["recall"] += recall(found, best)
+            row["top1"] += found[-1].elim_score == best[-1].elim_score
+            row["seconds"] += seconds
+            row["full_seconds"] += full_seconds
+
+    return {
+        name: {
+            n: dict(
+                recall=row["recall"] / len(games),
+                top1=row["top1"] / len(games),
+                speedup=row["full_seconds"] / row["seconds"],
+            )
+            for n, row in by_limit.items()
+        }
+        for name, by_limit in totals.items()
+    }
+
+
+def _color(recall: float) -> str:
+    return CGREEN if recall >= 0.99 else CYELLOW if recall >= 0.9 else CRED
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--opener", default="crate")
+    parser.add_argument("--states", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--limits", type=int, nargs="+", default=[4000, 2000, 1000, 500, 250, 125])
+    parser.add_argument("--json", help="also write the report here")
+    args = parser.parse_args()
+
+    games = states(args.opener, args.states, args.seed)
+    report = benchmark(games, args.limits, args.k)
+
+    print(f"\n{'ranker':>8} {'N':>5} {f'recall@{args.k}':>10} {'top-1':>6} {'speedup':>8}")
+    for name, by_limit in report.items():
+        for n, row in by_limit.items():
+            recall_s = c(_color(row["recall"]), f"{row['recall']:10.1%}")
+            print(f"{name:>8} {n:>5} {recall_s} {row['top1']:6.0%} {row['speedup']:7.1f}x")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(dict(vars(args), report=report), f, indent=2)
 
 
 if __name__ == "__main__":
-    foo(yield_guesses("crate"))
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""Plays every solution (or a seeded sample) to the end with each of the
+given strategies, and reports how many guesses they took, how often
+they failed, and how long each decision took.
+
+    scripts/simulate.py --strategies elim options --sample 200 --json report.json
+
+Unless ELDROW_ELIM_STORE is set, scores are cached in a throwaway store,
+so that timings are comparable from run to run.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("ELDROW_ELIM_STORE", os.path.join(tempfile.mkdtemp(), "elims.sqlite"))
+
+from eldrow.simulate import MAX_GUESSES, STRATEGIES, report, simulate  # noqa: E402
+from eldrow.words import sols  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+        "--strategies", nargs="+", default=sorted(STRATEGIES), choices=sorted(STRATEGIES)
+    )
+    parser.add_argument("--sample", type=int, help="play only this many solutions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--opener", default="slate", help="the first guess; '' to let the strategy choose"
+    )
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--json", help="also write the report here")
+    args = parser.parse_args()
+
+    solutions = list(sols)
+    if args.sample:
+        solutions = random.Random(args.seed).sample(solutions, min(args.sample, len(solutions)))
+
+    reports = dict()
+    for strategy in args.strategies:
+        started = time.monotonic()
+        results = simulate(strategy, solutions, args.opener or None, workers=args.workers)
+        reports[strategy] = report(results, time.monotonic() - started)
+
+    print(
+        f"{'strategy':>8} {'games':>6} {'mean':>6} {'fail':>6} {'s/decision':>10} {'p95':>7}  distribution"
+    )
+    for strategy, r in reports.items():
+        per = r["seconds_per_decision"]
+        mean = f"{r['mean_guesses']:6.3f}" if r["mean_guesses"] is not None else f"{'-':>6}"
+        print(
+            f"{strategy:>8} {r['games']:>6} {mean} {r['failure_rate']:6.1%} {per['mean']:10.3f}"
+            f" {per['p95']:7.3f}  {' '.join(f'{k}:{v}' for k, v in r['distribution'].items())}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(dict(vars(args), max_guesses=MAX_GUESSES, reports=reports), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,51 @@
+import os
+from collections import Counter, OrderedDict
+
+import pytest
+
 import eldrow.auto_limit as al
 import eldrow.game as g
-from eldrow.constrain import ALPHA, constraint, given2, merge_constraints
+from eldrow.constrain import ALPHA, constraint, given, given2, merge_constraints, packed_constraint
+from eldrow.elimination import (
+    answer,
+    bounded_elimination_scorer,
+    elimination_keys,
+    elimination_scorer,
+    equivalence_classes,
+    sampled_elimination_estimator,
+)
 from eldrow.explore import explore
 from eldrow.game import Game, best_elim
+from eldrow.memoize import TieredStore, cache_keys, digest, elim_store, fingerprint, pickle_cache
+from eldrow.parallel import chunked, shared_words, words
+from eldrow.patterns import answers, pattern, pattern_matrix, pattern_to_guess, solved
+from eldrow.progress import TopK
+from eldrow.wordindex import WordIndex, options
 from eldrow.words import sols
 
 
+@pytest.fixture(autouse=True, scope="session")
+def worker_elim_store(tmp_path_factory):
+    # the pool's processes open whatever store this names when they start
+    before = os.environ.get("ELDROW_ELIM_STORE")
+    os.environ["ELDROW_ELIM_STORE"] = str(tmp_path_factory.mktemp("elims") / "elims.sqlite")
+    yield
+    if before is None:
+        del os.environ["ELDROW_ELIM_STORE"]
+    else:
+        os.environ["ELDROW_ELIM_STORE"] = before
+
+
+@pytest.fixture(autouse=True)
+def fresh_elim_store(monkeypatch, worker_elim_store):
+    """Every test scores from scratch, rather than reading back what an
+    earlier test (or run) stored under the same keys.
+    """
+    monkeypatch.setattr(elim_store, "_persistent", dict())
+    monkeypatch.setattr(elim_store, "_lru", OrderedDict())
+    monkeypatch.setattr(elim_store, "_pending", dict())
+
+
 def test_constraint():
     elims, cc = constraint("S(ES)an")
     assert len(elims) == 5
@@ -132,3 +172,456 @@ def test_best_elim_carat():
     words = "cr(a)te", "cAr(a)t"
     game = Game(5, sols, ALPHA, "mania", words, list(), set())
     best_elim(game, game.wl)
+
+
+def test_pattern():
+    assert pattern("brown", "boron") == 2 + 1 * 3 + 1 * 9 + 0 * 27 + 2 * 81  # B(OR)oN
+    assert pattern("abbey", "kebab") == 0 + 1 * 3 + 2 * 9 + 1 * 27 + 1 * 81  # k(E)B(AB)
+    assert pattern("crate", "crate") == solved(5)
+    matrix = pattern_matrix()
+    opts = ("mania", "manic", "mafia")
+    assert list(matrix.patterns("mason", opts, matrix.columns(opts))) == [
+        pattern(s, "mason") for s in opts
+    ]
+
+
+def test_elimination_scorer_counts_pattern_buckets():
+    opts = ("mania", "manic", "mafia", "magic")
+    scorer = elimination_scorer(opts)
+    # buckets are {mania}, {mafia} and {manic, magic}; guessing 'mafia'
+    # when it is the solution leaves nothing rather than one word.
+    assert scorer("mafia") == (4 * 4 - (1 + 1 + 2 * 2) + 1) / 4
+
+
+def test_word_index_options():
+    wl = ("sassy", "sales", "seals", "lasso", "basis")
+    index = WordIndex(wl)
+    assert index.select(index.at(0, "s")) == ["sassy", "sales", "seals"]
+    assert index.select(index.at_least("s", 3)) == ["sassy"]
+    assert index.select(index.all) == list(wl)
+    assert options(given("SAlt(S)"), wl=wl) == ["sassy"]
+
+
+def test_options_narrow_incrementally_and_pop_restores():
+    game = g.new_game(ALPHA, sols)
+    game.guesses.append("cr(a)te")
+    after_one = g.get_options(game)
+    one_state = game.states[-1]
+    game.guesses.append("cAr(a)t")
+    assert set(g.get_options(game)) < set(after_one)
+    assert g.get_options(game) == tuple(options(given(*game.guesses), wl=sols))
+
+    game.guesses.pop()
+    assert g.get_options(game) == after_one
+    assert game.states[-1] is one_state
+
+
+def test_answers_batch():
+    solutions = ("brown", "abbey", "sassy", "eerie", "crate")
+    for guess in ("boron", "kebab", "geese", "sissy", "crate"):
+        codes = answers(guess, solutions)
+        assert list(codes) == [pattern(s, guess) for s in solutions]
+        for s, code in zip(solutions, codes):
+            assert pattern_to_guess(guess, code) == answer(s, guess)
+    assert pattern_to_guess("boron", pattern("brown", "boron")) == "B(OR)oN"
+
+
+def test_packed_constraint():
+    a, b = packed_constraint("S(ES)an"), packed_constraint("S(LO)wS")
+    assert len({a, b, packed_constraint("S(ES)an")}) == 2
+    assert a.merge(b).eliminations() == merge_constraints(constraint("S(ES)an"), constraint("S(LO)wS"))
+    assert given("S(ES)an", "S(LO)wS").allowances() == given2("S(ES)an", "S(LO)wS")
+    assert given().allowances() == ({i: set(ALPHA) for i in range(5)}, dict())
+
+
+def test_gray_limits_count():
+    assert packed_constraint("S(S)bsd").limits() == dict(s=2, b=0, d=0)
+    assert packed_constraint("(B)Btb").limits() == dict(b=2, t=0)
+    assert packed_constraint("crate").limits() == dict.fromkeys("crate", 0)
+    assert packed_constraint("S(LO)wS").limits() == dict(w=0)
+
+    wl = ("sushi", "sises", "sisal", "sassy")
+    # 'sises' has room for a third s, but the gray s says there are only two.
+    assert options(given("S(S)bsd"), wl=wl) == ["sushi", "sisal"]
+    assert options(given("S(S)bsd"), wl=wl) == [w for w in wl if answer(w, "ssbsd") == "S(S)bsd"]
+
+
+def test_cache_keys_are_stable_across_processes():
+    import subprocess
+    import sys
+
+    key = digest("v", ("crate", "slate"), frozenset("abc"), dict(x=1.5))
+    assert key == digest("v", ("crate", "slate"), frozenset("cba"), dict(x=1.5))
+    assert key != digest("v", ("slate", "crate"), frozenset("abc"), dict(x=1.5))
+    for seed in ("1", "2"):
+        other = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "from eldrow.memoize import digest;"
+                "print(digest('v', ('crate', 'slate'), frozenset('abc'), dict(x=1.5)))",
+            ],
+            env=dict(os.environ, PYTHONHASHSEED=seed),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert other.stdout.strip() == key
+
+
+def test_tiered_store_batches_writes():
+    persistent: dict = dict()
+    store = TieredStore(lambda: persistent, max_size=2, flush_every=3)
+    store["a"], store["b"] = 1, 2
+    assert persistent == dict()
+    assert store.lookup("a") == ("memory", 1)
+    store["c"] = 3  # evicts b, and flushes all three
+    assert persistent == dict(a=1, b=2, c=3)
+    assert store.lookup("b") == ("persistent", 2)
+
+    counted = pickle_cache(store)("v")(lambda x: x * 2)
+    assert counted(4) == counted(4) == 8
+    assert counted.hit_rate == (0.5, 0.5, 0.0)
+    assert store.stats.evictions == 3 and store.stats.pending == 1
+    store.commit()
+    assert store.stats.pending == 0
+
+
+def test_tiered_store_looks_up_many_at_once(tmp_path):
+    from sqlitedict import SqliteDict
+
+    store = TieredStore(lambda: SqliteDict(str(tmp_path / "s.sqlite"), autocommit=False), max_size=2)
+    doubled = pickle_cache(store)("v")(lambda x: x * 2)
+    for x in range(1000):
+        doubled(x)
+    store.commit()
+    keys = [cache_keys("v")(x) for x in (998, 999, 3, 4, 1000)]
+    assert store.lookup_many(keys) == dict(zip(keys, (1996, 1998, 6, 8)))
+    assert (store.stats.hits, store.stats.persistent_hits) == (2, 2)
+
+
+def test_elimination_scores_are_shared_by_option_set():
+    opts = ("mania", "manic", "mafia", "magic", "mambo")
+    first = elimination_scorer(opts)
+    second = elimination_scorer(tuple(reversed(opts)))
+    assert first("gizmo") == second("gizmo")
+    assert second.hit_rate.overall == 1.0  # type: ignore
+
+
+def test_chunked():
+    assert chunked("abcdefg", 3) == [tuple("abc"), tuple("def"), tuple("g")]
+    assert chunked("ab", 5) == [("a",), ("b",)]
+    assert chunked("", 4) == []
+
+
+def test_shared_words():
+    with shared_words(("abbey", "kebab"), ()) as (shared, empty):
+        assert words(shared) == ("abbey", "kebab")
+        assert words(empty) == ()
+        assert os.path.exists(shared.path)
+    assert not os.path.exists(shared.path)
+
+
+def test_best_elim_matches_one_scorer_over_every_word():
+    game = Game(5, sols, ALPHA, "", ["c(R)anE"], list(), set())
+    opts = g.get_options(game)
+    scorer = elimination_scorer(opts)
+    elims = best_elim(g.hashable(game), sols[:300], workers=1)
+    assert sorted(w.scored_word for w in elims) == sorted(sols[:300])
+    assert all(w.elim_score == scorer(w.scored_word) for w in elims)
+    assert [w.elim_score for w in elims] == sorted(w.elim_score for w in elims)
+
+
+def test_top_k_keeps_the_greatest_best_last():
+    top = TopK(3, key=lambda w: (len(w), w))
+    for word in ["a", "ccc", "bb", "dddd", "ee", "f"]:
+        top.push(word)
+    assert top.sorted() == ["ee", "ccc", "dddd"]
+    assert top.best() == "dddd"
+
+    everything = TopK(None, key=len)
+    for word in ["bb", "a", "ccc"]:
+        everything.push(word)
+    assert everything.sorted() == ["a", "bb", "ccc"]
+
+
+def test_best_elim_limit_is_the_tail_of_the_full_ranking():
+    game = g.hashable(Game(5, sols, ALPHA, "", ["cRate"], list(), set()))
+    full = best_elim(game, sols[:400], workers=1)
+    assert best_elim(game, sols[:400], workers=1, limit=5) == full[-5:]
+
+
+def test_best_elim_with_a_budget_prunes_across_chunks(monkeypatch):
+    game = g.hashable(Game(5, sols, ALPHA, "", ["cRate"], list(), set()))
+    exact = best_elim(game, sols[:1000], workers=1, limit=5)
+    thresholds = list()
+    elim_scores = g._elim_scores
+
+    def spy(*task):
+        thresholds.append(task[-1])
+        return elim_scores(*task)
+
+    monkeypatch.setattr(g, "_elim_scores", spy)
+    assert best_elim(game, sols[:1000], workers=1, limit=5, budget=60.0) == exact
+    # every chunk after the first starts from the best 5 of those before it
+    assert len(thresholds) > 2 and thresholds[0] is None
+    assert None not in thresholds[1:] and thresholds[1:] == sorted(thresholds[1:])
+
+
+def test_bounded_elimination_scorer_only_prunes_words_below_the_threshold():
+    game = Game(5, sols, ALPHA, "", ["sLate"], list(), set())
+    opts = g.get_options(game)
+    exact = elimination_scorer(opts)
+    bounded = bounded_elimination_scorer(opts)
+    threshold = sorted(exact(w) for w in sols)[-15]
+    scores = [bounded(w, threshold) for w in sols]
+    assert None in scores
+    for word, score in zip(sols, scores):
+        if score is None:
+            assert exact(word) < threshold
+        else:
+            assert score == exact(word)
+
+
+def test_equivalence_classes_share_elimination_scores():
+    game = Game(5, sols, ALPHA, "", ["crane", "sLoth"], list(), set())
+    opts = g.get_options(game)
+    scorer = elimination_scorer(opts)
+    classes = equivalence_classes(sols, opts)
+    assert len(classes) < len(sols) / 4
+    assert sorted(i for members in classes for i in members) == list(range(len(sols)))
+    for members in classes:
+        assert len({scorer(sols[i]) for i in members}) == 1
+
+
+def test_auto_limit_follows_the_budget_and_corrects_itself(monkeypatch, tmp_path):
+    monkeypatch.setattr(al, "_CALIBRATION_FILE", str(tmp_path / "calibration.json"))
+    monkeypatch.setattr(al, "_CALIBRATION", al.Calibration(1e-4, 1e-6, 1.0, al.parallel.workers()))
+    limit = al.auto_limit(100, budget=2.0)
+    assert abs(al.auto_limit(100, budget=20.0) - 10 * limit) < 10
+    assert al.auto_limit(1000, budget=2.0) < limit
+
+    # a run that takes twice as long as expected lowers the next limit
+    al.observe(limit, 100, 4.0)
+    assert al.auto_limit(100, budget=2.0) < limit
+    assert al._load() == al.calibration()
+
+
+def test_sampled_estimate_is_exact_for_few_options_and_close_for_many():
+    few = g.get_options(Game(5, sols, ALPHA, "", ["sLate"], list(), set()))
+    exact, estimate = elimination_scorer(few), sampled_elimination_estimator(few)
+    assert all(estimate(w) == exact(w) for w in sols[:200])
+
+    many = sols[:1000]
+    exact, estimate = elimination_scorer(many), sampled_elimination_estimator(many, sample_size=200)
+    best = max(sols[:300], key=exact)
+    assert best in sorted(sols[:300], key=estimate)[-20:]
+
+
+def test_solve_matches_exhaustive_search_and_round_trips(tmp_path):
+    from functools import lru_cache
+
+    from eldrow.solve import Node, load, save, solve
+
+    game = g.HashableGame(5, sols, ALPHA, ("crATE",), tuple())
+    opts = g.get_options(game)
+    guesses = sorted(set(opts) | set(sols[:40]))
+
+    @lru_cache(maxsize=None)
+    def exhaustive(options: tuple) -> float:
+        if len(options) == 1:
+            return 1.0
+        best = float("inf")
+        for guess in guesses:
+            buckets: dict = dict()
+            for word, code in zip(options, answers(guess, options)):
+                buckets.setdefault(code, list()).append(word)
+            if len(buckets) == 1 and solved(5) not in buckets:
+                continue
+            rest = sum(len(b) * exhaustive(tuple(b)) for code, b in buckets.items() if code != solved(5))
+            best = min(best, 1 + rest / len(options))
+        return best
+
+    tree = solve(game, width=len(guesses), guesses=guesses)
+    assert 3 <= tree.options == len(opts)
+    assert abs(tree.expected - exhaustive(tuple(sorted(opts)))) < 1e-9
+    assert solve(game, "worst", width=len(guesses), guesses=guesses).worst <= tree.worst
+
+    path = str(tmp_path / "tree.json")
+    save(tree, path)
+    assert load(path) == tree
+    assert isinstance(load(path).children, dict) and all(
+        isinstance(child, Node) for child in tree.children.values()
+    )
+
+
+def test_solve_finishes_within_a_small_multiple_of_its_budget():
+    import time
+
+    from eldrow.solve import solve
+
+    # the opener's biggest bucket: hundreds of options, far too many to search fully
+    code, n = Counter(answers("slate", sols)).most_common(1)[0]
+    game = g.HashableGame(5, sols, ALPHA, (pattern_to_guess("slate", code),), tuple())
+    started = time.monotonic()
+    tree = solve(game, budget=0.5)
+    assert time.monotonic() - started < 4 * 0.5
+    assert tree.options == n > 100 and tree.worst >= 2
+
+
+def test_opening_book_answers_as_best_elim_would(tmp_path):
+    from eldrow import book
+    from eldrow.words import five_letter_word_list
+
+    start = g.HashableGame(5, sols, ALPHA, ("crATE",), tuple())
+    built = book.build(start, "slate", k=5, workers=1)
+    path = str(tmp_path / "book.json.gz")
+    book.save(built, path)
+    assert book.load(path) == built
+
+    states = [state for state in book._next_states(start, "slate") if len(g.get_options(state)) > 1]
+    assert states and len(built.entries) == len({book._key(g.get_options(s)) for s in states})
+    for state in states:
+        found = book.lookup(state, 3, path=path)
+        expected = best_elim(state, five_letter_word_list, workers=1, limit=3)
+        assert [w.elim_score for w in found] == [w.elim_score for w in expected]
+    assert book.lookup(start, path=path) is None
+
+
+def test_simulate_plays_every_solution_to_the_end():
+    from eldrow.simulate import report, simulate
+
+    solutions = sols[:60:3]
+    results = simulate("options", solutions, workers=1)
+    assert [result.solution for result in results] == list(solutions)
+    assert all(result.solved and result.guesses[-1] == result.solution for result in results)
+    assert all(result.guesses[0] == "slate" for result in results)
+
+    summary = report(results, 1.0)
+    assert summary["games"] == sum(summary["distribution"].values()) == len(solutions)
+    assert summary["decisions"] <= sum(len(result.guesses) - 1 for result in results)
+
+
+def test_cross_board_scores_match_each_board_scored_alone():
+    from eldrow.multi import elim_across_games
+
+    games = {
+        1: Game(5, sols, ALPHA, "", ["sLate"], list(), set()),
+        2: Game(5, sols, ALPHA, "", ["crATE"], list(), set()),
+        3: Game(5, sols, ALPHA, "", ["sLate"], list(), set()),
+    }
+    candidates = sols[:300]
+    scorers = {key: elimination_scorer(g.get_options(game)) for key, game in games.items()}
+    for word, ce in elim_across_games(games, candidates):
+        ratio = 1.0
+        for key, game in games.items():
+            n = len(g.get_options(game))
+            ratio *= (scorers[key](word) + 1) / n
+            assert (key in ce.solved) == (scorers[key](word) >= n - 1)
+            assert (key in ce.option) == (word in g.get_options(game))
+        assert ce.elim_ratio == ratio
+
+    best = elim_across_games(games, candidates, limit=5, horizon=1)
+    opts = {key: g.get_options(game) for key, game in games.items()}
+    likeliest = max(sum((w in o) / len(o) for o in opts.values()) for w in candidates)
+    assert best[-1][1].expected_solved == round(likeliest, 6)
+
+
+def test_cross_board_scores_are_looked_up_once_stored(monkeypatch):
+    import eldrow.multi as m
+
+    games = {
+        1: Game(5, sols, ALPHA, "", ["sLate"], list(), set()),
+        2: Game(5, sols, ALPHA, "", ["crATE"], list(), set()),
+    }
+    candidates = sols[:200]
+    first = m.elim_across_games(games, candidates, horizon=2)
+
+    def no_patterns(*args):
+        raise AssertionError("every board's scores should be in the store")
+
+    monkeypatch.setattr(m, "answers", no_patterns)
+    assert m.elim_across_games(games, candidates, horizon=2) == first
+    # ...under the very keys elimination_scorer keeps its scores
+    opts = g.get_options(games[2])
+    key = elimination_keys(fingerprint(sorted(opts)))(candidates[0])
+    assert elim_store[key] == elimination_scorer(opts)(candidates[0])
+
+
+def test_batch_scores_are_exactly_the_per_word_scores():
+    from eldrow.scoring import (
+        construct_position_freqs,
+        replace_solved_with_average_totals,
+        score_batch,
+        score_for_novelty,
+        score_words,
+    )
+
+    opts = g.get_options(Game(5, sols, ALPHA, "", ["sLate"], list(), set()))
+    freqs = construct_position_freqs(opts)
+    candidates = sols[:500] + ("geese", "mamma")
+    for scorer in (score_words(freqs), score_for_novelty(replace_solved_with_average_totals(freqs))):
+        for starting in ((), ("slate",), ("slate", "bobby")):
+            assert scorer.score_batch(starting, candidates) == [scorer(*starting, w) for w in candidates]
+        # words that can't be encoded together are scored one at a time
+        assert scorer.score_batch(("slate",), ("crane", "éclat", "abc")) == [
+            scorer("slate", w) for w in ("crane", "éclat", "abc")
+        ]
+
+    eliminations = elimination_scorer(opts)
+    assert score_batch(eliminations, ("slate",), candidates) == [eliminations(w) for w in candidates]
+    # scorers without a batch are called once per candidate
+    assert score_batch(lambda *words: len(words[-1]), ("slate",), ("crane", "abc")) == [5, 3]
+
+
+def test_compiled_word_list_reads_as_the_text_does(tmp_path):
+    from eldrow import words as wl
+    from eldrow.scoring import construct_position_freqs, position_scores
+
+    text = wl._read_text("five_letter_word_list")
+    path = str(tmp_path / "compiled" / "words.eldw")
+    assert wl.compile_words(text, path, dict())
+    compiled = wl.Compiled(path)
+    assert compiled.words() == text == wl.five_letter_word_list
+    assert all(word in compiled for word in text[::97])
+    assert "zzzzz" not in compiled and "slat" not in compiled and "slatés" not in compiled
+    assert construct_position_freqs(text) == position_scores
+
+    # lists that don't fit the format are read as text instead
+    assert not wl.compile_words(("slate", "slat"), path + "x", dict())
+
+
+def test_any_alphabet_encodes_densely_and_termo_folds_accents(tmp_path):
+    from eldrow import words as wl
+    from eldrow.alphabet import alphabet_of, fold_accents
+    from eldrow.parse import paren_yellow_parse
+    from eldrow.scoring import construct_position_freqs, score_batch, score_for_novelty, score_words
+
+    cyrillic = ("слово", "столб", "полка", "книга", "вилка", "ключь", "колос")
+    alphabet = alphabet_of(cyrillic)
+    assert alphabet.decode(alphabet.encode("книга")) == "книга" and max(alphabet.encode("ключь")) < 16
+    for guess in cyrillic + ("ааааа",):
+        assert list(answers(guess, cyrillic)) == [pattern(s, guess) for s in cyrillic]
+    freqs = construct_position_freqs(cyrillic)
+    for scorer in (score_words(freqs), score_for_novelty(freqs)):
+        assert score_batch(scorer, ["колос"], cyrillic) == [scorer("колос", w) for w in cyrillic]
+
+    path = str(tmp_path / "cyrillic.eldw")
+    assert wl.compile_words(cyrillic, path, dict())
+    compiled = wl.Compiled(path)
+    assert compiled.words() == cyrillic and "полка" in compiled and "палка" not in compiled
+    assert compiled.position_counts() == {i: dict(Counter(w[i] for w in cyrillic)) for i in range(5)}
+
+    assert fold_accents("SUÍte") == "SUIte" and fold_accents("ação") == "acao"
+    assert paren_yellow_parse("ÁV(id)O") == (
+        ("green", "á"),
+        ("green", "v"),
+        ("yellow", "i"),
+        ("yellow", "d"),
+        ("green", "o"),
+    )
+    termo = wl._read_text("sols", "termo")
+    assert "suite" in termo and "avido" in termo and "suíte" not in termo
+    game = Game(5, termo, frozenset(alphabet_of(termo).symbols), "", list(), list(), set())
+    game.guesses.append(pattern_to_guess("serao", pattern("suite", "serao")))
+    assert "suite" in g.get_options(game)